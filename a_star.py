@@ -1,42 +1,298 @@
 import heapq
-from typing import List, Tuple, Optional
+import math
+from array import array
+from typing import Iterable, List, Tuple, Optional, Union
 
-# NOTE: will need modifying to handle floats if maze has valyes between 0 and 1.
-def astar(maze: List[List[int]]) -> Optional[List[Tuple[int, int]]]:
+import numpy as np
+
+from grid_graph import DEGREE, GridGraph
+
+Position = Tuple[int, int]
+
+
+class AStar:
+    """
+    A* search over the free cells of a GridGraph, reusable across many queries on the same area.
+
+    g-scores, parent pointers and closed flags live in flat arrays indexed by node id. Each entry is
+    tagged with the id of the search that wrote it, so a new query never has to clear the buffers and
+    only pays for the nodes it expands. The path is rebuilt from the parent pointers once a goal is
+    reached instead of being copied onto every frontier entry.
+
+    With weighted=True entering a cell costs its attractiveness value (the same score as
+    GridGraph.path_cost(weighted=True), e.g. for areas from area_generator.weight_area), otherwise every
+    move costs 1. The heuristic is the manhattan distance scaled by the cheapest cell cost, so it stays
+    admissible on float costs. Ties on f are broken on the smaller heuristic and then the smaller node
+    id, so results are deterministic.
     """
-    Find the shortest path through a grid maze using A* alg. 
-    
+
+    def __init__(self, graph: GridGraph, weighted=False):
+        self.graph = graph
+        self.weighted = weighted
+        nodes = graph.num_nodes
+        self.costs = memoryview(graph.attractiveness) if weighted else None
+        self.min_cost = float(graph.attractiveness.min()) if weighted and nodes else 1.0
+        self.g_score = array("d", bytes(8 * nodes))
+        self.parent = array("i", bytes(4 * nodes))
+        # id of the search that last set a node's g_score / closed it, 0 is never a valid search id
+        self.seen = array("i", bytes(4 * nodes))
+        self.closed = array("i", bytes(4 * nodes))
+        self._search_id = 0
+
+    def search(
+        self, start: Optional[int] = None, goal: Union[int, Iterable[int], None] = None
+    ) -> Optional[List[int]]:
+        """
+        Find the cheapest path between two nodes.
+
+        Args:
+            start: node id to start from, the graph's start by default
+            goal: node id to reach, or several node ids to reach the nearest of. The graph's goal by
+                default
+
+        Returns:
+            the node ids of the path from start to goal inclusive, or None if no route is possible
+        """
+        graph = self.graph
+        start = graph.start if start is None else start
+        goal = graph.goal if goal is None else goal
+        # node ids read from the graph's arrays are numpy integers, so test for a scalar rather than int
+        goals = [goal] if np.ndim(goal) == 0 else list(goal)
+        goals = [int(g) for g in goals if g >= 0]
+        if start < 0 or not goals:
+            return None
+
+        self._search_id += 1
+        search_id = self._search_id
+        g_score, parent, seen, closed = self.g_score, self.parent, self.seen, self.closed
+        # stepped through as memoryviews of the graph's arrays, so no Python lists of the area are built
+        table, cells, cols, costs = graph.table_view, graph.cell_view, graph.cols, self.costs
+        goal_set = set(goals)
+        targets = [divmod(cells[g], cols) for g in goals]
+        min_cost = self.min_cost
+
+        def heuristic(node: int) -> float:
+            x, y = divmod(cells[node], cols)
+            return min_cost * min(abs(gx - x) + abs(gy - y) for gx, gy in targets)
+
+        g_score[start] = 0.0
+        parent[start] = -1
+        seen[start] = search_id
+        h = heuristic(start)
+        # priority queue: (f_score, heuristic, node), stale entries are skipped when popped
+        frontier = [(h, h, start)]
+
+        while frontier:
+            _, _, current = heapq.heappop(frontier)
+            if closed[current] == search_id:
+                continue
+            closed[current] = search_id
+
+            if current in goal_set:
+                return self._rebuild(current)
+
+            current_g = g_score[current]
+            # neighbours are already bounds checked in the graph, -1 marks a blocked one
+            first = current * DEGREE
+            for neighbour in table[first : first + DEGREE]:
+                if neighbour < 0 or closed[neighbour] == search_id:
+                    continue
+                new_g = current_g + (costs[neighbour] if costs is not None else 1.0)
+                if seen[neighbour] == search_id and new_g >= g_score[neighbour]:
+                    continue
+                g_score[neighbour] = new_g
+                parent[neighbour] = current
+                seen[neighbour] = search_id
+                h = heuristic(neighbour)
+                heapq.heappush(frontier, (new_g + h, h, neighbour))
+
+        return None
+
+    def search_many(self, queries: Iterable[tuple]) -> List[Optional[List[int]]]:
+        """Answer a batch of (start, goal) node queries, reusing the same buffers for all of them."""
+        return [self.search(start, goal) for start, goal in queries]
+
+    def cost(self, path: List[int]) -> float:
+        """Cost of a path found by search, not counting the start cell it begins on."""
+        return self.graph.path_cost(path[1:], weighted=self.weighted)
+
+    def _rebuild(self, node: int) -> List[int]:
+        parent = self.parent
+        path = []
+        while node != -1:
+            path.append(node)
+            node = parent[node]
+        path.reverse()
+        return path
+
+
+def astar(
+    maze: List[List[int]],
+    graph: Optional[GridGraph] = None,
+    start: Optional[Position] = None,
+    goal: Optional[Position] = None,
+    weighted=False,
+) -> Optional[List[Tuple[int, int]]]:
+    """
+    Find the shortest path through a grid maze using A* alg.
+
+    A prebuilt GridGraph of the maze can be passed in to skip rebuilding the adjacency. start and goal
+    default to the top left and bottom right cells. With weighted=True, float mazes are searched on
+    their cell values, see AStar.
+
     Returns a list of positions from start to end, if None if no route is possible.
     """
-    rows, cols = len(maze), len(maze[0])
-    n = len(maze) - 1
-    start, goal = (0,0), (n,n)
-
-    def abs_difference(pos: Tuple[int, int]) -> int:
-        return abs(goal[0] - pos[0]) + abs(goal[1] - pos[1])
-
-    # priority queue: (fitness=absolute distance from goal, g_score=length of current path , position, path)
-    frontier = [(abs_difference(start), 0, start, [start])]
-    visited = set()
-
-    while frontier:
-        f_score, g_score, current, path = heapq.heappop(frontier)
-
-        if current in visited:
-            continue
-
-        visited.add(current)
-
-        if current == goal:
-            return path
-        
-        x, y = current
-        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-            nx, ny = x + dx, y + dy
-            
-            if (0 <= nx < rows and 0 <= ny < cols and maze[nx][ny] != 0 and (nx, ny) not in visited):
-                new_g = g_score + 1
-                new_f = new_g + abs_difference((nx, ny))
-                heapq.heappush(frontier, (new_f, new_g, (nx, ny), path + [(nx, ny)]))
-
-    return None
\ No newline at end of file
+    graph = graph if graph is not None else GridGraph(maze)
+    start_node = graph.start if start is None else graph.node(start)
+    goal_node = graph.goal if goal is None else graph.node(goal)
+
+    path = AStar(graph, weighted).search(start_node, goal_node)
+    if path is None:
+        return None
+    return graph.to_positions(path)
+
+
+class IncrementalAStar:
+    """
+    Shortest path between two fixed cells that is repaired, rather than searched again, when cells
+    change (Lifelong Planning A*, the fixed start form of D* Lite).
+
+    g-scores and one step lookahead rhs-scores are kept for every cell. After update() only the cells
+    whose scores are affected by the changed cells are expanded again, so small changes to a large
+    area cost a small amount of work. Works on flat cell indices i * cols + j of the area rather than
+    GridGraph nodes, as node ids shift whenever a cell is opened or blocked.
+
+    Cell costs are as in AStar: entering a cell costs 1, or its value with weighted=True.
+    """
+
+    def __init__(
+        self,
+        area,
+        start: Optional[Position] = None,
+        goal: Optional[Position] = None,
+        weighted=False,
+    ):
+        self.area = np.array(area, dtype=float)
+        self.rows, self.cols = self.area.shape
+        self.weighted = weighted
+        start = (0, 0) if start is None else start
+        goal = (self.rows - 1, self.cols - 1) if goal is None else goal
+        self.start = start[0] * self.cols + start[1]
+        self.goal = goal[0] * self.cols + goal[1]
+        self._reset()
+
+    def _cost(self, cell: int) -> float:
+        """Cost of entering a cell, inf when it is blocked."""
+        value = self.values[cell]
+        if value == 0:
+            return math.inf
+        return value if self.weighted else 1.0
+
+    def _reset(self):
+        """Forget every score, the next path() searches from scratch."""
+        cells = self.rows * self.cols
+        self.values = self.area.ravel().tolist()
+        free = [v for v in self.values if v != 0]
+        self.min_cost = min(free) if self.weighted and free else 1.0
+        self.g = [math.inf] * cells
+        self.rhs = [math.inf] * cells
+        self.rhs[self.start] = 0.0
+        self.frontier = [(*self._key(self.start), self.start)]
+
+    def _neighbours(self, cell: int) -> List[int]:
+        i, j = divmod(cell, self.cols)
+        neighbours = []
+        if i > 0:
+            neighbours.append(cell - self.cols)
+        if i < self.rows - 1:
+            neighbours.append(cell + self.cols)
+        if j > 0:
+            neighbours.append(cell - 1)
+        if j < self.cols - 1:
+            neighbours.append(cell + 1)
+        return neighbours
+
+    def _key(self, cell: int) -> tuple:
+        best = min(self.g[cell], self.rhs[cell])
+        i, j = divmod(cell, self.cols)
+        gi, gj = divmod(self.goal, self.cols)
+        return best + self.min_cost * (abs(gi - i) + abs(gj - j)), best
+
+    def _update_cell(self, cell: int):
+        if cell != self.start:
+            cost = self._cost(cell)
+            self.rhs[cell] = min(self.g[p] for p in self._neighbours(cell)) + cost
+        # stale frontier entries are skipped when popped, so an inconsistent cell is just pushed again
+        if self.g[cell] != self.rhs[cell]:
+            heapq.heappush(self.frontier, (*self._key(cell), cell))
+
+    def _compute(self):
+        g, rhs, frontier, goal = self.g, self.rhs, self.frontier, self.goal
+        while frontier and (frontier[0][:2] < self._key(goal) or rhs[goal] != g[goal]):
+            *old_key, cell = heapq.heappop(frontier)
+            if g[cell] == rhs[cell]:
+                continue
+            new_key = self._key(cell)
+            if tuple(old_key) < new_key:
+                heapq.heappush(frontier, (*new_key, cell))
+                continue
+
+            if g[cell] > rhs[cell]:
+                g[cell] = rhs[cell]
+            else:
+                g[cell] = math.inf
+                self._update_cell(cell)
+            for neighbour in self._neighbours(cell):
+                self._update_cell(neighbour)
+
+    def update(self, changes) -> None:
+        """
+        Apply cell changes and mark the cells whose scores they affect.
+
+        Args:
+            changes: ((x, y), value) pairs or a {(x, y): value} dict, 0 blocks a cell
+        """
+        changes = changes.items() if isinstance(changes, dict) else changes
+        changed = []
+        for (x, y), value in changes:
+            self.area[x, y] = value
+            cell = x * self.cols + y
+            self.values[cell] = float(value)
+            changed.append(cell)
+
+        # a cheaper cell than any before would make the heuristic overestimate, so start over
+        if self.weighted and any(0 < self.values[c] < self.min_cost for c in changed):
+            self._reset()
+            return
+
+        # entering a changed cell got cheaper or dearer, which changes its own and its neighbours' scores
+        for cell in changed:
+            self._update_cell(cell)
+            for neighbour in self._neighbours(cell):
+                self._update_cell(neighbour)
+
+    def _endpoints_open(self) -> bool:
+        return self._cost(self.start) != math.inf and self._cost(self.goal) != math.inf
+
+    def path(self) -> Optional[List[Position]]:
+        """The cheapest path as positions from start to goal, None if no route is possible."""
+        if not self._endpoints_open():
+            return None
+        self._compute()
+        if self.g[self.goal] == math.inf:
+            return None
+
+        # walk back from the goal through the neighbour each cell's score came from
+        cell, cells = self.goal, [self.goal]
+        while cell != self.start:
+            cell = min(self._neighbours(cell), key=lambda p: (self.g[p], p))
+            cells.append(cell)
+        cells.reverse()
+        return [divmod(c, self.cols) for c in cells]
+
+    def cost(self) -> float:
+        """Cost of the current cheapest path, not counting the start cell, inf if there is none."""
+        if not self._endpoints_open():
+            return math.inf
+        self._compute()
+        return self.g[self.goal]
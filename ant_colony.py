@@ -1,6 +1,13 @@
-import random
 from typing import List
+import time
+import numpy as np
 from ant_system import Ant, AntSystem
+from grid_graph import GridGraph
+from sampling import choose
+
+# "batched" applies the ACS local updates of a generation once its tours are built, the same for every
+# engine and number of workers. "sequential" applies them as each ant moves, like the original ACS
+LOCAL_UPDATES = ("batched", "sequential")
 
 
 class AntColony(AntSystem):
@@ -13,12 +20,42 @@ class AntColony(AntSystem):
         evaporation=0.05,
         init_pheromone=0.1,
         exploitation_threshold=0.3,
+        engine="ants",
+        workers=1,
+        seed=None,
+        lazy_evaporation=False,
+        pheromone_dtype=float,
+        pheromone_file=None,
+        goal_guidance=False,
+        start=None,
+        goal=None,
+        graph=None,
+        local_updates="batched",
     ):
         # set elites to 1 so we only update using the global best ant
-        super().__init__(area, num_of_ants, 1, alpha, beta, evaporation)
+        super().__init__(
+            area,
+            num_of_ants,
+            1,
+            alpha,
+            beta,
+            evaporation,
+            engine,
+            workers,
+            seed,
+            lazy_evaporation,
+            pheromone_dtype,
+            pheromone_file,
+            goal_guidance,
+            start,
+            goal,
+            graph,
+        )
         self._validate_ac_values(init_pheromone, exploitation_threshold)
+        self._validate_local_updates(local_updates, engine, workers)
         self.t_0 = init_pheromone
         self.q = exploitation_threshold
+        self.local_updates = local_updates
         self.pher_mat.fill(init_pheromone)
 
     def _validate_ac_values(self, t_0, q):
@@ -27,71 +64,131 @@ class AntColony(AntSystem):
         if t_0 < 0:
             raise ValueError(f"init pheromone must be 0 or greater, was {t_0}")
 
+    def _validate_local_updates(self, local_updates, engine, workers):
+        if local_updates not in LOCAL_UPDATES:
+            raise ValueError(f"local_updates must be one of {LOCAL_UPDATES}, but was {local_updates}")
+        if local_updates == "sequential" and (engine != "ants" or workers > 1):
+            raise ValueError("sequential local updates need the 'ants' engine without workers")
+
+    def _state_params(self) -> dict:
+        return {
+            **super()._state_params(),
+            "init_pheromone": self.t_0,
+            "q": self.q,
+            "local_updates": self.local_updates,
+        }
+
+    def _initial_pheromone(self) -> float:
+        return self.t_0
+
+    def _make_ant(self, rng=None) -> "ACAnt":
+        # batched, the colony applies every ant's local updates once the generation is built
+        sequential = self.local_updates == "sequential"
+        return ACAnt(self, self.graph, self.alpha, self.beta, self.q, rng=rng, local_update=sequential)
+
     def _get_solutions(self, ants: List["Ant"]) -> List["Ant"]:
         """Generate solutions for all ants in the colony."""
-        # create ant population
-        ants = [
-            ACAnt(self, len(self.attractiveness) - 1, self.alpha, self.beta, self.q)
-            for _ in range(self.ant_num)
-        ]
-
-        # generate solution for each ant
-        for ant in ants:
-            ant.generate_solution(self.pher_mat, self.attractiveness)
+        generation = self._next_generation()
+        # with batched local updates the ants all read the trails as they were at the start of the
+        # generation, so a seed gives the same tours however they are built
+        if self._colony_engine is not None:
+            ants = self._get_vectorized_solutions(ants, generation, self.q)
+        elif self._parallel is not None:
+            ants = self._get_parallel_solutions(ants, generation)
+        else:
+            # reset the pooled ants, each with its own stream for this generation
+            for i, ant in enumerate(ants):
+                ant.reset(self._ant_rng(generation, i))
+            # sequential local updates keep self.desirability current as the ants go
+            for ant in ants:
+                ant.generate_solution(self.pher_mat, self.desirability.weights)
+            if self.local_updates == "sequential":
+                return ants
 
+        started = time.perf_counter()
+        self._batched_local_update(ants)
+        self._local_update_time = time.perf_counter() - started
         return ants
 
+    def _batched_local_update(self, ants: List["Ant"]) -> None:
+        """
+        Apply the ACS local update for a whole generation at once.
+
+        A cell visited by k ants gets the local update applied k times, which collapses to
+        t_ij = t_0 + (1 - decay)^k * (t_ij - t_0). The result does not depend on the order of the ants.
+        """
+        rows, cols, _ = self._tour_deposits(ants)
+        cells, visits = np.unique(
+            np.ravel_multi_index((rows, cols), self.pher_mat.shape), return_counts=True
+        )
+        touched = np.unravel_index(cells, self.pher_mat.shape)
+        decay = (1 - self.evaporation) ** visits
+        self.pher_mat[touched] = self.t_0 + decay * (self.pher_mat[touched] - self.t_0)
+        self.desirability.refresh_nodes(self.pher_mat, self.graph.node_of_cell[cells])
+
 
 # TODO: now that we are passing the parent system, we don't really need to pass any of the parent's properties as parameters...
 # i.e. trail_level and attractiveness could just be fetched when they are needed directly from the parent
-# NOTE: when parallelising this (if if do parallelise this) write access to the pheromone matrix will need to be protected / atomic
+# NOTE: unless local_updates is "sequential", ants skip local updates while they move and the colony applies
+# them in one batch afterwards
 class ACAnt(Ant):
+    __slots__ = ("parent_system", "q_threshold", "local_update")
+
     def __init__(
         self,
         parent_system: AntColony,
-        area_bounds,
+        graph: GridGraph,
         alpha,
         beta,
         q=0.3,
         backtrack_limit=10,
+        rng=None,
+        local_update=True,
     ):
-        super().__init__(area_bounds, alpha, beta, backtrack_limit)
+        super().__init__(graph, alpha, beta, backtrack_limit, rng)
         self.parent_system = parent_system
         self.q_threshold = q
+        # ants built in a batch leave local updates to the colony, see AntColony._batched_local_update
+        self.local_update = local_update
 
-    def _move(self, trail_level, attractiveness) -> bool:
-        directions = self._get_valid_directions()
-        moves = self._get_valid_moves(directions, attractiveness)
+    def _move(self, trail_level, desirability) -> bool:
+        moves = self._get_valid_moves()
 
         if len(moves) == 0:
             # no move possible so not a valid route
             return False
 
+        # every move takes two draws whichever way it goes, in the same order as VectorizedColony
+        exploit = self.rng.random() <= self.q_threshold
+        draw = self.rng.random()
+
         # if q threshold is not met then focus on exploiting the best available move
-        if random.random() <= self.q_threshold:
+        if exploit:
             # pick the move with the best pheromone + attractiveness product
+            graph = self.graph
+            cells, cols, attractiveness = graph.cell_view, graph.cols, graph.attractiveness
             chosen_move = max(
-                moves, key=lambda pos: trail_level[pos] * attractiveness[pos]
+                moves, key=lambda m: trail_level[divmod(cells[m], cols)] * attractiveness[m]
             )
         else:
-            move_prob = self._calculate_move_probabilities(
-                trail_level, attractiveness, moves
-            )
-            chosen_move = random.choices(moves, move_prob)[0]
+            weights = [desirability[m] for m in moves]
+            chosen_move = moves[choose(weights, draw)]
 
         self._update_position(chosen_move)
         # local pheromone update for all ants
-        self._update_local_pheromones(chosen_move)
+        if self.local_update:
+            self._update_local_pheromones(chosen_move)
 
         return True
 
     # to be called on every construction step i.e. after every move
     # encourages the exploration of other paths by reducing pheromone levels on visited edges
-    def _update_local_pheromones(self, move: tuple[int, int]):
+    def _update_local_pheromones(self, move: int):
         # t_ij = (1 - decay) * t_ij + decay * init_trail_level
-        i, j = move
+        i, j = divmod(self.graph.cell_view[move], self.graph.cols)
         # NOTE: could make local decay a seperate parameter for finer control
         decay = self.parent_system.evaporation
         pheromone_level = self.parent_system.pher_mat[i, j]
         res = (1 - decay) * pheromone_level + decay * self.parent_system.t_0
         self.parent_system.pher_mat[i, j] = res
+        self.parent_system.desirability.update(move, res)
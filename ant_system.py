@@ -1,22 +1,160 @@
-from typing import List
-import random
+from array import array
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Union
+import asyncio
+import json
+import os
+import time
 import numpy as np
 
+from colony_engine import VectorizedColony
+from grid_graph import DEGREE, GridGraph, allocate
+from metrics import GenerationMetrics, GenerationRecord
+from parallel import ParallelConstructor
+from pheromone import STAMP_DTYPE, Desirability, LazyPheromoneMatrix
+from sampling import AntStream, choose, colony_seed, default_stream
+from stopping import StoppingCriterion
+
 PRINT_INTERVAL = 10
+# "ants" builds tours with one Ant object per ant, "vectorized" advances the whole colony as arrays
+ENGINES = ("ants", "vectorized")
+# files written by AntSystem.save_state
+PHEROMONE_FILE = "pheromone.npy"
+STATE_FILE = "state.json"
+# ways AntSystem.apply_changes can repair the pheromone around changed cells
+REPAIRS = ("smooth", "reset")
 
 
 class AntSystem:
     def __init__(
-        self, area, num_of_ants: int, elites: int, alpha=1.0, beta=1.0, evaporation=0.05
+        self,
+        area,
+        num_of_ants: int,
+        elites: int,
+        alpha=1.0,
+        beta=1.0,
+        evaporation=0.05,
+        engine="ants",
+        workers=1,
+        seed: Union[int, np.random.Generator, None] = None,
+        lazy_evaporation=False,
+        pheromone_dtype=float,
+        pheromone_file: Optional[str] = None,
+        goal_guidance=False,
+        start: Optional[tuple] = None,
+        goal: Optional[tuple] = None,
+        graph: Optional[GridGraph] = None,
     ):
         self._validate_init_values(alpha, beta, evaporation, num_of_ants, elites)
-        self.pher_mat = np.zeros_like(area, dtype=float)
-        self.attractiveness = np.array(area)
+        self._validate_engine(engine, workers)
+        if graph is not None and (start is not None or goal is not None):
+            raise ValueError("start and goal cannot be given with a graph, the graph's own are used")
+        # a memory mapped area (see area_store) is used in place rather than read into memory, as is
+        # the area of a prebuilt graph, whose owner already holds it
+        if isinstance(area, np.memmap):
+            self.attractiveness = area
+        else:
+            self.attractiveness = np.asarray(area) if graph is not None else np.array(area)
+        # trails can be kept in a compact dtype such as float32, and in a np.memmap file for areas
+        # larger than memory. Every other per cell and per node array then goes in temporary files
+        # next to it
+        levels = scratch = None
+        if pheromone_file is not None:
+            levels = np.memmap(
+                pheromone_file, dtype=pheromone_dtype, mode="w+", shape=self.attractiveness.shape
+            )
+            scratch = os.path.dirname(os.path.abspath(pheromone_file))
+        # free cell adjacency, built once and shared by every ant of every generation. Ants route from
+        # start to goal (the top left and bottom right cells by default), a prebuilt graph of the area
+        # can be passed in to share it between systems
+        if graph is None:
+            graph = GridGraph(self.attractiveness, start, goal, scratch)
+        self.graph = graph
+        # lazily evaporated trails only pay for the cells ants touch, see LazyPheromoneMatrix
+        if lazy_evaporation:
+            stamps = allocate(self.attractiveness.shape, STAMP_DTYPE, scratch)
+            self.pher_mat = LazyPheromoneMatrix(
+                self.attractiveness.shape, evaporation, dtype=pheromone_dtype, values=levels,
+                stamps=stamps,
+            )
+        elif levels is not None:
+            self.pher_mat = levels
+        else:
+            self.pher_mat = np.zeros(self.attractiveness.shape, dtype=pheromone_dtype)
         self.elites = elites
         self.ant_num = num_of_ants
         self.alpha = alpha
         self.beta = beta
         self.evaporation = evaporation
+        self.goal_guidance = goal_guidance
+        self.engine = engine
+        self.workers = workers
+        # move weights of every node, kept up to date with the trails and read by every engine
+        self.desirability = self._make_desirability()
+        self._colony_engine = (
+            VectorizedColony(self.graph, alpha, beta)
+            if engine == "vectorized"
+            else None
+        )
+        # every ant draws from its own stream derived from (seed, generation, ant index), so the same
+        # seed gives the same tours with any engine or number of workers
+        self.seed = colony_seed(seed)
+        self._generation = 0
+        self._parallel = None
+        # seconds the last generation spent in batched ACS local updates, see AntColony
+        self._local_update_time = 0.0
+        # best ant seen across every run of this system
+        self.best_ant = None
+
+    def _validate_engine(self, engine, workers):
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, but was {engine}")
+        if workers < 1:
+            raise ValueError(f"workers must be 1 or greater, was {workers}")
+        if workers > 1 and engine != "ants":
+            raise ValueError("workers can only be used with the 'ants' engine")
+
+    def _next_generation(self) -> int:
+        """Return the index of the generation about to be built."""
+        generation = self._generation
+        self._generation += 1
+        return generation
+
+    def _make_desirability(self) -> Desirability:
+        # only ants built in this process read the weights as a Python list
+        keep_list = self.engine == "ants" and self.workers == 1
+        return Desirability(
+            self.graph, self.alpha, self.beta, self.goal_guidance, self.evaporation, keep_list
+        )
+
+    def _make_ant(self, rng=None) -> "Ant":
+        return Ant(self.graph, self.alpha, self.beta, rng=rng)
+
+    def _ant_rng(self, generation: int, index: int) -> AntStream:
+        return AntStream.for_ant(self.seed, generation, index)
+
+    def _ant_rngs(self, generation: int) -> List[AntStream]:
+        return [self._ant_rng(generation, i) for i in range(self.ant_num)]
+
+    @contextmanager
+    def _construction_pool(self):
+        """Keep a process pool of tour builders alive for the duration of a run, if workers > 1."""
+        if self.workers == 1:
+            yield
+            return
+
+        self._parallel = ParallelConstructor(self, self.workers)
+        try:
+            yield
+        finally:
+            self._parallel.close()
+            self._parallel = None
+
+    def _restart_pool(self):
+        """Point the process pool at the current area, after apply_changes() rebuilt the graph."""
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = ParallelConstructor(self, self.workers)
 
     def _validate_init_values(self, alpha, beta, evaporation, num_of_ants, elites):
         if alpha < 0:
@@ -28,207 +166,634 @@ class AntSystem:
         if elites > num_of_ants:
             raise ValueError("Number of elites cannot exceed number of ants")
 
+    def _state_params(self) -> dict:
+        """Parameters a saved state must have been made with to be loaded into this system."""
+        return {
+            "system": type(self).__name__,
+            "ant_num": self.ant_num,
+            "elites": self.elites,
+            "alpha": self.alpha,
+            "beta": self.beta,
+            "evaporation": self.evaporation,
+            "goal_guidance": self.goal_guidance,
+            "start": list(self.graph.start_position),
+            "goal": list(self.graph.goal_position),
+        }
+
+    def save_state(self, directory: str) -> None:
+        """
+        Checkpoint the colony into a directory, so a run can be resumed exactly with load_state().
+
+        The pheromone matrix is written as pheromone.npy, which can be memory mapped, and everything
+        else (parameters, generation, colony seed, best tour) as state.json.
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, PHEROMONE_FILE), np.asarray(self.pher_mat))
+
+        best = None
+        if self.best_ant is not None:
+            best = {"nodes": self.best_ant.tour_nodes.tolist(), "score": self.best_ant.tour_score}
+        state = {
+            "params": self._state_params(),
+            "shape": list(self.attractiveness.shape),
+            "generation": self._generation,
+            # every ant's stream derives from the seed and generation, so they are all it takes to resume
+            "seed": self.seed,
+            "best": best,
+            "run": self._run_state(),
+        }
+        with open(os.path.join(directory, STATE_FILE), "w") as f:
+            json.dump(state, f)
+
+    def load_state(self, directory: str) -> None:
+        """
+        Resume from a checkpoint made by save_state() on a system with the same area and parameters.
+
+        Raises:
+            ValueError: if the checkpoint was made with a different area shape or parameters
+        """
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            state = json.load(f)
+        if state["params"] != self._state_params():
+            raise ValueError(
+                f"state was saved with {state['params']}, but this system has {self._state_params()}"
+            )
+        if tuple(state["shape"]) != self.attractiveness.shape:
+            raise ValueError(f"state was saved for an area of shape {tuple(state['shape'])}")
+
+        self.warm_start(os.path.join(directory, PHEROMONE_FILE))
+        self._generation = state["generation"]
+        self.seed = state["seed"]
+        self._load_run_state(state.get("run", {}))
+
+        self.best_ant = None
+        if state["best"] is not None:
+            self.best_ant = self._make_ant().load_tour(state["best"]["nodes"])
+            self.best_ant.tour_score = state["best"]["score"]
+
+    def _run_state(self) -> dict:
+        """Anything else a subclass tracks across generations that a checkpoint has to keep."""
+        return {}
+
+    def _load_run_state(self, state: dict) -> None:
+        pass
+
+    def warm_start(self, pheromone) -> None:
+        """
+        Start from pheromone levels learned elsewhere, e.g. on a similar area, instead of the initial ones.
+
+        Args:
+            pheromone: a matrix of the same shape as the area, a .npy file of one (read memory
+                mapped), or a checkpoint directory made by save_state()
+        """
+        if isinstance(pheromone, str):
+            if os.path.isdir(pheromone):
+                pheromone = os.path.join(pheromone, PHEROMONE_FILE)
+            pheromone = np.load(pheromone, mmap_mode="r")
+        if np.shape(pheromone) != self.pher_mat.shape:
+            raise ValueError(
+                f"pheromone of shape {np.shape(pheromone)} does not fit an area of shape {self.pher_mat.shape}"
+            )
+
+        # a lazy matrix stamps every cell with its current generation, so it starts from these levels too
+        self.pher_mat[...] = pheromone
+        self.desirability.invalidate()
+
+    def apply_changes(self, changes, repair="smooth", radius=1) -> None:
+        """
+        Change cells of the area and keep optimizing from the current state.
+
+        Only the pheromone around the changed cells is repaired, the rest of what the colony has learned
+        is kept. The best ant is kept too unless its tour crosses a cell that is now blocked. Pair this
+        with a_star.IncrementalAStar to keep the optimal baseline up to date just as cheaply.
+
+        Can be called between the generations of iter_generations(), the run carries on with the new
+        area from the next generation.
+
+        Args:
+            changes: ((x, y), value) pairs or a {(x, y): value} dict, 0 blocks a cell
+            repair: "smooth" sets the pheromone around each changed cell to the mean level of the free
+                cells there, "reset" sets it back to the initial level
+            radius: how many cells around each changed cell are repaired
+
+        Raises:
+            ValueError: if the changes would leave no route from start to goal, the system is left
+                as it was
+        """
+        if repair not in REPAIRS:
+            raise ValueError(f"repair must be one of {REPAIRS}, but was {repair}")
+        changes = list(changes.items() if isinstance(changes, dict) else changes)
+        # the area can be a read only memmap or an array the caller still holds (see __init__), so the
+        # changes go into a copy of it. An integer area would truncate fractional values
+        fractional = any(isinstance(v, float) and not v.is_integer() for _, v in changes)
+        area = np.array(self.attractiveness, dtype=float if fractional else None)
+        for (x, y), value in changes:
+            area[x, y] = value
+        # node ids shift when cells open or close, so the graph and everything holding ids is rebuilt
+        graph = GridGraph(
+            area, self.graph.start_position, self.graph.goal_position, self.graph.scratch
+        )
+        if graph.start < 0 or graph.goal < 0 or graph.goal_distance[graph.start] < 0:
+            # ants would search forever for a route that does not exist
+            raise ValueError(
+                f"the changes leave no route from {graph.start_position} to {graph.goal_position}"
+            )
+
+        best_tour = self.best_ant.tour if self.best_ant is not None else None
+        self.attractiveness = area
+        self.graph = graph
+        self.desirability = self._make_desirability()
+        if self._colony_engine is not None:
+            self._colony_engine = VectorizedColony(self.graph, self.alpha, self.beta)
+
+        for (x, y), _ in changes:
+            self._repair_pheromone(x, y, repair, radius)
+
+        self.best_ant = None
+        if best_tour is not None and self.graph.start >= 0:
+            nodes = [self.graph.node(position) for position in best_tour]
+            if all(v >= 0 for v in nodes):
+                self.best_ant = self._make_ant().load_tour(nodes)
+
+    def accept_migrant(self, nodes) -> bool:
+        """
+        Take in a tour found by another colony, e.g. by islands.IslandModel.
+
+        The tour deposits pheromone like an elite ant would, and becomes the best ant if it beats it.
+
+        Args:
+            nodes: node ids of the tour, from its first move up to and including the goal
+
+        Returns:
+            True if the tour became the best ant
+        """
+        migrant = self._make_ant().load_tour(nodes)
+        self._deposit([migrant])
+        if self.best_ant is None or migrant.tour_score < self.best_ant.tour_score:
+            self.best_ant = migrant
+            return True
+        return False
+
+    def _initial_pheromone(self) -> float:
+        """Level the trails start at, and are reset to when the area changes."""
+        return 0.0
+
+    def _repair_pheromone(self, x: int, y: int, repair: str, radius: int):
+        window = (
+            slice(max(x - radius, 0), x + radius + 1),
+            slice(max(y - radius, 0), y + radius + 1),
+        )
+        free = self.attractiveness[window] != 0
+        level = self._initial_pheromone()
+        if repair == "smooth" and free.any():
+            level = float(self.pher_mat[window][free].mean())
+        # blocked cells are never entered, their level goes back to the initial one
+        self.pher_mat[window] = np.where(free, level, self._initial_pheromone())
+
     def _pheromone_update(self, ants: List["Ant"]) -> None:
         """Update pheromone matrix based on ant tours."""
         # evaporate existing pheromones
-        self.pher_mat *= 1.0 - self.evaporation
-
-        # add new pheromones from each ant
-        for ant in ants:
-            pheromone_delta = 1.0 / ant.tour_score
-            for i, j in ant.tour:
-                self.pher_mat[i][j] += pheromone_delta
-
-    def run(self, generations: int) -> "Ant":
-        ants = [
-            Ant(len(self.attractiveness) - 1, self.alpha, self.beta)
-            for _ in range(self.ant_num)
-        ]
-        for g in range(generations):
-            # if g < PRINT_INTERVAL or g % PRINT_INTERVAL == 0:
-            #   print(f"generation: {g}/{generations}")
+        if isinstance(self.pher_mat, LazyPheromoneMatrix):
+            self.pher_mat.evaporate()
+        else:
+            self.pher_mat *= 1.0 - self.evaporation
+        self.desirability.evaporate()
+
+        self._deposit(ants)
+
+    def _deposit(self, ants: List["Ant"]) -> None:
+        """Add the pheromone of every ant's tour in a single scatter-add."""
+        rows, cols, deltas = self._tour_deposits(ants)
+        if isinstance(self.pher_mat, LazyPheromoneMatrix):
+            self.pher_mat.deposit(rows, cols, deltas)
+        else:
+            np.add.at(self.pher_mat, (rows, cols), deltas)
+        self.desirability.refresh_nodes(self.pher_mat, self._nodes_at(rows, cols))
+
+    def _nodes_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return self.graph.node_of_cell[np.ravel_multi_index((rows, cols), self.pher_mat.shape)]
+
+    def _tour_deposits(self, ants: List["Ant"]) -> tuple:
+        """
+        Concatenate ant tours into coordinate arrays.
 
-            # create ants and complete a tour for each one
-            ants = self._get_solutions(ants)
-            ants.sort(key=lambda a: a.tour_score)
+        Returns:
+            rows, cols and the pheromone delta of every visited cell, in ant order
+        """
+        ants = [ant for ant in ants if ant.tour_len]
+        if not ants:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+
+        nodes = np.concatenate([np.asarray(ant.tour_nodes, dtype=np.int64) for ant in ants])
+        deltas = np.repeat(
+            [1.0 / ant.tour_score for ant in ants], [ant.tour_len for ant in ants]
+        )
+        rows, cols = self.graph.coordinates(nodes)
+        return rows, cols, deltas
+
+    def run(
+        self,
+        generations: int,
+        callback: Optional[Callable[[GenerationMetrics], None]] = None,
+        stop: Union[StoppingCriterion, List[StoppingCriterion], None] = None,
+    ) -> "Ant":
+        """
+        Run the colony for up to a number of generations.
 
-            # update pheromone matrix
-            elite_ants = ants[: self.elites]
-            self._pheromone_update(elite_ants)
+        Pheromone levels and the best ant seen (self.best_ant) carry over from earlier runs of the
+        system, or from a loaded state, so a run can be continued by calling run() again.
+
+        Args:
+            generations: the most generations to run
+            callback: called with the GenerationMetrics of every generation, if given
+            stop: criteria that can end the run early, see stopping.py. The run stops as soon as any
+                of them is met
+
+        Returns:
+            the best ant of the final generation
+        """
+        # one pool of ants is reused by every generation of the run
+        ants = [self._make_ant() for _ in range(self.ant_num)]
+        for _, ants, _ in self._generations(ants, generations, callback, stop):
+            pass
 
         # return ant with the best score at the end of all generations
         """ NOTE: doing it this way kind of assumes that the ants have converged / stopped improving.
-        It may be more wise to store the best ant seen across all generations and returning that instead.
+        The best ant seen across all generations is kept in self.best_ant for callers that want it instead.
         In ACO this ant is already stored for global pheromone updates... """
         ants.sort(key=lambda a: a.tour_score)
         return ants[0]
 
+    def iter_generations(
+        self,
+        generations: int,
+        callback: Optional[Callable[[GenerationMetrics], None]] = None,
+        stop: Union[StoppingCriterion, List[StoppingCriterion], None] = None,
+    ) -> Iterator[GenerationRecord]:
+        """
+        Run like run(), but yield a GenerationRecord as soon as each generation is done.
+
+        Records only hold a copy of the generation's best tour, no ants are kept alive. Stop consuming
+        (or close() the generator) to cancel the search, e.g. once a good enough route has arrived.
+        """
+        ants = [self._make_ant() for _ in range(self.ant_num)]
+        run_best = self.best_ant.tour_score if self.best_ant is not None else float("inf")
+        for g, ants, elapsed in self._generations(ants, generations, callback, stop):
+            best = ants[0]
+            yield GenerationRecord(
+                generation=g,
+                best_tour=best.tour_nodes.copy(),
+                best_score=best.tour_score,
+                mean_score=sum(a.tour_score for a in ants) / len(ants),
+                run_best_score=self.best_ant.tour_score,
+                improved=best.tour_score < run_best,
+                elapsed=elapsed,
+            )
+            # apply_changes() between generations can drop the best ant
+            run_best = self.best_ant.tour_score if self.best_ant is not None else float("inf")
+
+    async def aiter_generations(
+        self,
+        generations: int,
+        callback: Optional[Callable[[GenerationMetrics], None]] = None,
+        stop: Union[StoppingCriterion, List[StoppingCriterion], None] = None,
+    ) -> AsyncIterator[GenerationRecord]:
+        """
+        iter_generations() for asyncio code, every generation is built in the loop's default executor
+        so the event loop stays free while the colony works. Cancelling the consumer ends the search once
+        the generation being built has finished.
+        """
+        loop = asyncio.get_running_loop()
+        records = self.iter_generations(generations, callback, stop)
+        pending = None
+        try:
+            while True:
+                pending = loop.run_in_executor(None, next, records, None)
+                # shielded so a cancellation leaves the generation running rather than abandoning it
+                record = await asyncio.shield(pending)
+                if record is None:
+                    return
+                yield record
+        finally:
+            # records cannot be closed while the executor is still inside it
+            if pending is not None and not pending.done():
+                await asyncio.wait([pending])
+            records.close()
+
+    def _generations(
+        self,
+        ants: List["Ant"],
+        generations: int,
+        callback: Optional[Callable[[GenerationMetrics], None]],
+        stop: Union[StoppingCriterion, List[StoppingCriterion], None],
+    ) -> Iterator[tuple]:
+        """
+        The generation loop shared by run() and iter_generations().
+
+        Yields:
+            (generation, the pooled ants sorted best first, seconds the generation took) once every
+            generation's pheromone update is done. The ants are only valid until the next one
+        """
+        criteria = [stop] if isinstance(stop, StoppingCriterion) else list(stop or [])
+        for criterion in criteria:
+            criterion.start(self)
+
+        graph = self.graph
+        with self._construction_pool():
+            for g in range(generations):
+                # if g < PRINT_INTERVAL or g % PRINT_INTERVAL == 0:
+                #   print(f"generation: {g}/{generations}")
+                started = time.perf_counter()
+
+                if self.graph is not graph:
+                    # apply_changes() renumbered the nodes, so the pooled ants and workers start over
+                    # on the new graph
+                    graph = self.graph
+                    ants = [self._make_ant() for _ in ants]
+                    self._restart_pool()
+
+                # the move weights follow the trails as they change, only uneven changes (clamping,
+                # warm starts) leave every node to be recomputed here
+                self.desirability.sync(self.pher_mat)
+                # create ants and complete a tour for each one
+                ants = self._get_solutions(ants)
+                constructed = time.perf_counter()
+                ants.sort(key=lambda a: a.tour_score)
+                ranked = time.perf_counter()
+
+                # check for new best ant, copied as the pooled ant is reused next generation
+                if self.best_ant is None or ants[0].tour_score < self.best_ant.tour_score:
+                    self.best_ant = ants[0].copy()
+
+                # update pheromone matrix
+                self._pheromone_update(self._elite_ants(ants))
+
+                if callback is not None:
+                    callback(self._generation_metrics(g, ants, started, constructed, ranked))
+                yield g, ants, time.perf_counter() - started
+                if any(criterion(self, g, ants) for criterion in criteria):
+                    break
+
+    def _elite_ants(self, ants: List["Ant"]) -> List["Ant"]:
+        """The ants that deposit pheromone this generation, from ants sorted best first."""
+        return ants[: self.elites]
+
+    def _generation_metrics(
+        self, generation: int, ants: List["Ant"], started: float, constructed: float, ranked: float
+    ) -> GenerationMetrics:
+        """Collect the metrics of a generation whose pheromone update has just finished."""
+        updated = time.perf_counter()
+        moves, backtracks, resets = self._construction_counts(ants)
+        return GenerationMetrics(
+            generation=generation,
+            construction_time=constructed - started - self._local_update_time,
+            sort_time=ranked - constructed,
+            pheromone_time=updated - ranked,
+            local_update_time=self._local_update_time,
+            moves=moves,
+            backtracks=backtracks,
+            resets=resets,
+            best_score=ants[0].tour_score,
+            mean_score=sum(a.tour_score for a in ants) / len(ants),
+        )
+
+    def _construction_counts(self, ants: List["Ant"]) -> tuple:
+        """Total moves, backtracks and resets of the last generation, from whichever built its tours."""
+        if self._colony_engine is not None:
+            return self._colony_engine.counts
+        if self._parallel is not None:
+            return self._parallel.counts
+        return (
+            sum(a.moves for a in ants),
+            sum(a.backtracks for a in ants),
+            sum(a.resets for a in ants),
+        )
+
     def _get_solutions(self, ants: List["Ant"]) -> List["Ant"]:
-        # create ant population
-        ants = [
-            Ant(len(self.attractiveness) - 1, self.alpha, self.beta)
-            for _ in range(self.ant_num)
-        ]
+        generation = self._next_generation()
+        if self._colony_engine is not None:
+            return self._get_vectorized_solutions(ants, generation)
+        if self._parallel is not None:
+            return self._get_parallel_solutions(ants, generation)
+
+        # reset the pooled ants, each with its own stream for this generation
+        for i, a in enumerate(ants):
+            a.reset(self._ant_rng(generation, i))
 
         # generate solution for each ant
         for a in ants:
-            a.generate_solution(self.pher_mat, self.attractiveness)
+            a.generate_solution(self.pher_mat, self.desirability.weights)
 
         return ants
 
+    def _get_vectorized_solutions(
+        self, ants: List["Ant"], generation: int, exploitation_threshold=None
+    ) -> List["Ant"]:
+        """Build every tour of the generation at once with the vectorized colony engine."""
+        tours = self._colony_engine.construct(
+            self.pher_mat,
+            self.desirability.values,
+            self._ant_rngs(generation),
+            exploitation_threshold,
+        )
+        return [ant.load_tour(tour) for ant, tour in zip(ants, tours)]
 
-class ElitistAntSystem(AntSystem):
-    def run(self, generations: int) -> "Ant":
-        bounds = len(self.attractiveness) - 1
-        ants = [
-            Ant(len(self.attractiveness) - 1, self.alpha, self.beta)
-            for _ in range(self.ant_num)
-        ]
-
-        best_ant = Ant(bounds, self.alpha, self.beta)
-        best_ant.tour_score = float("inf")
-
-        for g in range(generations):
-            # create tours for each ant
-            ants = self._get_solutions(ants)
-            ants.sort(key=lambda a: a.tour_score)
-
-            # check for new best ant
-            if ants[0].tour_score < best_ant.tour_score:
-                best_ant = ants[0]
+    def _get_parallel_solutions(self, ants: List["Ant"], generation: int) -> List["Ant"]:
+        """Build every tour of the generation across the process pool."""
+        tours = self._parallel.construct(self.pher_mat, self.desirability.values, generation)
+        return [ant.load_tour(tour) for ant, tour in zip(ants, tours)]
 
-            # update pheromone matrix
-            elite_ants = ants[: self.elites] + [best_ant]
-            self._pheromone_update(elite_ants)
 
-        # return ant with the best score at the end of all generations
-        ants.sort(key=lambda a: a.tour_score)
-        return ants[0]
-        # NOTE: could also just return 'best_ant' here, but I feel as though it is more fair between
-        # systems to use the best from the final generation
+class ElitistAntSystem(AntSystem):
+    def _elite_ants(self, ants: List["Ant"]) -> List["Ant"]:
+        # the best ant of the run deposits on top of this generation's elites
+        return ants[: self.elites] + [self.best_ant]
+        # NOTE: run() still returns the best from the final generation rather than 'best_ant', as I feel
+        # as though it is more fair between systems
 
 
 class Ant:
-    def __init__(self, area_bounds, alpha, beta, backtrack_limit=10):
-        self.position = (0, 0)
-        self.area_bounds = area_bounds
+    # ants are pooled and reused every generation, so keep them small and free of per-instance dicts
+    __slots__ = (
+        "graph",
+        "node",
+        "alpha",
+        "beta",
+        "tour_score",
+        "tour_len",
+        "_tour",
+        "visited",
+        "dead",
+        "_dead_nodes",
+        "backtrack_limit",
+        "rng",
+        "backtracks",
+        "resets",
+        "_discarded_moves",
+    )
+
+    def __init__(self, graph: GridGraph, alpha, beta, backtrack_limit=10, rng=None):
+        self.graph = graph
+        self.node = graph.start
         self.alpha = alpha
         self.beta = beta
         # tour score, this will be the sum of the positions visited
         self.tour_score = 0.0
-        self.tour_set = set()
-        self.tour = list()
-        # dead cells are cells where no solution is possible
-        self.dead_cells = set()
+        # the tour is kept as node ids in a preallocated buffer, only the first tour_len are in use
+        self.tour_len = 0
+        self._tour = array("i", bytes(4 * max(graph.rows + graph.cols, 16)))
+        # per node bitmaps of visited cells and dead cells (cells where no solution is possible).
+        # Dead ends of the area are known up front and stay dead, see GridGraph.dead_ends
+        self.visited = bytearray(graph.num_nodes)
+        self.dead = bytearray(graph.dead_ends)
+        self._dead_nodes = array("i")
         self.backtrack_limit = backtrack_limit
+        # source of uniform draws for move selection, see sampling.AntStream
+        self.rng = default_stream(rng)
+        # construction counters for run() metrics, only touched off the per move path
+        self._clear_counts()
+
+    @property
+    def tour_nodes(self) -> np.ndarray:
+        """Node ids of the tour, a view onto the ant's buffer that is only valid until it moves again."""
+        return np.frombuffer(self._tour, dtype=np.int32, count=self.tour_len)
+
+    @property
+    def tour(self) -> List[tuple]:
+        return self.graph.to_positions(self._tour[: self.tour_len])
+
+    @property
+    def tour_set(self) -> set:
+        return set(self.tour)
+
+    @property
+    def position(self) -> tuple:
+        return divmod(self.graph.cell_view[self.node], self.graph.cols)
+
+    @property
+    def moves(self) -> int:
+        """Cells entered while building the tour, including moves undone by backtracks and resets."""
+        return self.tour_len + self.backtracks + self._discarded_moves
 
     def get_tour_score(self) -> float:
         return self.tour_score
 
-    def _move(self, trail_level: np.ndarray, attractiveness: np.ndarray) -> bool:
+    def reset(self, rng=None) -> "Ant":
+        """Clear the ant so it can be reused for a new tour, optionally with a new source of randomness."""
+        self._reset_ant()
+        self._clear_counts()
+        self.rng = default_stream(rng)
+        return self
+
+    def copy(self) -> "Ant":
+        """Return an independent copy of this ant, e.g. to keep a best ant while the pool is reused."""
+        ant = Ant.__new__(type(self))
+        for slot in _all_slots(type(self)):
+            setattr(ant, slot, getattr(self, slot))
+        ant._tour = array("i", self._tour)
+        ant.visited = bytearray(self.visited)
+        ant.dead = bytearray(self.dead)
+        ant._dead_nodes = array("i", self._dead_nodes)
+        return ant
+
+    def load_tour(self, nodes) -> "Ant":
+        """Fill this ant with a tour of node ids that was built elsewhere, e.g. by the vectorized engine."""
+        self._reset_ant()
+        self._clear_counts()
+        for v in nodes:
+            self._update_position(int(v))
+        self.tour_score = self.graph.path_cost(nodes)
+        return self
+
+    def resume(self, nodes, dead_nodes, rng) -> "Ant":
+        """
+        Pick up a partly built tour, e.g. from the vectorized engine, with the cells found dead since it
+        last started over and the stream to keep drawing from.
+        """
+        self.reset(rng)
+        for v in nodes:
+            self._update_position(v)
+        for v in dead_nodes:
+            self.dead[v] = 1
+            self._dead_nodes.append(v)
+        return self
+
+    def _move(self, trail_level: np.ndarray, desirability: List[float]) -> bool:
         """
         Move ant to the next position in its tour, based in trail pheromone level and maze shape
 
         Args:
             trail_level: pheromone level matrix, of pheromones deposited by prev generations of ants
-            attractivness: how attractive each cell in an area is i.e. if the cell is free vs. blocked
+            desirability: move weight of every node, see pheromone.Desirability
 
         Returns:
             True if a move was made, False if none made.
             If no move was made then this tour is invalid and will need to be handled !
         """
-        directions = self._get_valid_directions()
-        moves = self._get_valid_moves(directions, attractiveness)
+        moves = self._get_valid_moves()
 
         if len(moves) == 0:
             # no possible move so not a valid route
             return False
 
-        move_prob = self._calculate_move_probabilities(
-            trail_level, attractiveness, moves
-        )
-        chosen_move = random.choices(moves, move_prob)[0]
+        weights = [desirability[m] for m in moves]
+        chosen_move = moves[choose(weights, self.rng.random())]
 
         self._update_position(chosen_move)
         return True
 
-    def _get_valid_directions(self) -> dict:
-        """Get movement directions that keep ant within bounds."""
-        directions = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
-
-        if self.position[1] <= 0:
-            directions.pop("up")
-        elif self.position[1] >= self.area_bounds:
-            directions.pop("down")
-        if self.position[0] <= 0:
-            directions.pop("left")
-        elif self.position[0] >= self.area_bounds:
-            directions.pop("right")
-
-        return directions
-
-    def _get_valid_moves(self, directions: dict, attractiveness: np.ndarray) -> List:
+    def _get_valid_moves(self) -> List[int]:
         """
-        Get valid ants mvoes from a list of directions.
-
-        Args:
-            directions: a map of valid directions for the ant to go in
-            attractiveness: a 2d array representing the maze / search space, where 0 means a blocked cell
+        Get valid ant moves from the current node.
 
         Returns:
-            a list of x,y moves that are not blocked and have not already been visited, and are not marked
-            as 'dead'.
+            a list of neighbouring node ids that have not already been visited and are not marked as 'dead'.
+            Blocked and out of bounds cells are -1 in the graph's neighbour table.
         """
-        moves = [
-            (self.position[0] + dx, self.position[1] + dy)
-            for dx, dy in directions.values()
-        ]
-
-        return list(
-            filter(
-                lambda m: attractiveness[m[0]][m[1]] != 0
-                and m not in self.tour_set
-                and m not in self.dead_cells,
-                moves,
-            )
-        )
-
-    def _calculate_move_probabilities(
-        self, trail_level: np.ndarray, attractiveness: np.ndarray, moves: List
-    ) -> List[float]:
-        move_prob = [
-            (trail_level[x][y] ** self.alpha) * (attractiveness[x][y] ** self.beta)
-            for x, y in moves
+        visited, dead = self.visited, self.dead
+        first = self.node * DEGREE
+        return [
+            m for m in self.graph.table_view[first : first + DEGREE]
+            if m >= 0 and not visited[m] and not dead[m]
         ]
 
-        prob_sum = sum(move_prob)
-        if prob_sum > 0:
-            return [p / prob_sum for p in move_prob]  # type: ignore
-
-        return [1.0 / len(moves)] * len(moves)
-
-    def _update_position(self, new_position: tuple):
+    def _update_position(self, node: int):
         """Update ant position and tour."""
-        self.position = new_position
-        self.tour.append(self.position)
-        self.tour_set.add(self.position)
-        # self.tour_score += attractiveness[self.position[0]][self.position[1]] # USE FOR NON BINARY ATTRACTIVENESS
+        if self.tour_len == len(self._tour):
+            # out of room, double the buffer (it is kept for the ant's following tours)
+            self._tour.extend(self._tour)
+        self.node = node
+        self._tour[self.tour_len] = node
+        self.tour_len += 1
+        self.visited[node] = 1
+        # self.tour_score += self.graph.attractiveness[node] # USE FOR NON BINARY ATTRACTIVENESS
         self.tour_score += 1
 
     def generate_solution(
-        self, trail_level: np.ndarray, attractiveness: np.ndarray
+        self,
+        trail_level: np.ndarray,
+        desirability: Optional[List[float]] = None,
+        backtrack_count=0,
     ) -> "Ant":
-        # make ant perform moves from start to the end point
-        end = (len(attractiveness) - 1, len(attractiveness) - 1)
-        backtrack_count = 0
-        while self.position != end:
-            valid = self._move(trail_level, attractiveness)
+        # move weights are normally shared by the whole colony, an ant on its own computes them itself
+        if desirability is None:
+            desirability = Desirability(self.graph, self.alpha, self.beta).refresh(trail_level).weights
+        # make ant perform moves from start to the end point, backtrack_count carries over the
+        # backtracks of a resumed tour
+        end = self.graph.goal
+        while self.node != end:
+            valid = self._move(trail_level, desirability)
             if not valid:
                 # if a valid solution is not created then backtrack until a limit is reached, then full reset
-                if backtrack_count < self.backtrack_limit:
+                # an ant stuck on the start cell has nothing to backtrack over so it is reset as well
+                if backtrack_count < self.backtrack_limit and self.tour_len:
                     self._backtrack()
                     backtrack_count += 1
+                    self.backtracks += 1
                 else:
+                    self._discarded_moves += self.tour_len
+                    self.resets += 1
                     self._reset_ant()
                     backtrack_count = 0
 
@@ -246,17 +811,34 @@ class Ant:
         This should only be called when ant is stuck, i.e. no valid moves available
         """
         # mark current cell as dead so ant doesnt return there
-        self.dead_cells.add(self.position)
+        self.dead[self.node] = 1
+        self._dead_nodes.append(self.node)
 
         # move back one time
-        last_position = self.tour.pop()
-        self.tour_set.remove(last_position)
+        self.tour_len -= 1
+        self.visited[self._tour[self.tour_len]] = 0
         self.tour_score -= 1
-        self.position = self.tour[-1]
+        self.node = self._tour[self.tour_len - 1] if self.tour_len else self.graph.start
 
     def _reset_ant(self):
-        self.position = (0, 0)
+        # only clear the bitmap entries this tour touched, visited nodes are exactly the tour
+        visited, dead = self.visited, self.dead
+        for v in self._tour[: self.tour_len]:
+            visited[v] = 0
+        # only cells found dead during this tour are cleared, the area's dead ends stay marked
+        for v in self._dead_nodes:
+            dead[v] = 0
+        del self._dead_nodes[:]
+
+        self.node = self.graph.start
         self.tour_score = 0.0
-        self.tour_set = set()
-        self.tour = list()
-        self.dead_cells = set()
+        self.tour_len = 0
+
+    def _clear_counts(self):
+        self.backtracks = 0
+        self.resets = 0
+        self._discarded_moves = 0
+
+
+def _all_slots(cls) -> List[str]:
+    return [slot for c in cls.__mro__ for slot in getattr(c, "__slots__", ())]
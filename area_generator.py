@@ -1,56 +1,108 @@
+import os
 import random
-from typing import List
+from typing import Iterable, List, Optional
+import numpy as np
 
-from disjoint_set import DS
+from disjoint_set import CHUNK, DS
 
-def create_area(n: int):
+def create_area(
+    n: int,
+    seed: Optional[int] = None,
+    out: Optional[np.ndarray] = None,
+    scratch: Optional[str] = None,
+    cols: Optional[int] = None,
+) -> np.ndarray:
     # 0 = traversable, 1 == not traversable
+    # areas are n x n, or n rows by cols columns for a rectangular one
     # NOTE: in the future I'll make this a float to signify 'speed' of traversal
 
-    # all cells start NOT traversable
-    area = [[0 for _ in range(n)] for _ in range(n)]
+    # all cells start NOT traversable. Cells are poked through a flat buffer, which is much cheaper
+    # than numpy to poke one cell at a time, and the finished area is a uint8 view onto it.
+    # out can be a zeroed (n, cols) uint8 np.memmap, e.g. from area_store.create_area_file, to generate
+    # areas larger than memory, and scratch a directory for the working arrays of such areas
+    cols = n if cols is None else cols
+    if out is None:
+        flat = bytearray(n * cols)
+        area = np.frombuffer(flat, dtype=np.uint8).reshape(n, cols)
+    else:
+        area = out
+        flat = memoryview(out.reshape(-1))
+    start, end = 0, n * cols - 1
 
     # select start point and end point at top left and bottom right
-    area[0][0] = 1
-    area[n-1][n-1] = 1
+    flat[start] = 1
+    flat[end] = 1
 
     # using a disjoint set to verify start and end connect, each cell starts as its own set
     # we then get a union of free adjacent cell sets and when a cell itself becomes free
-    disjoint = DS(area)
+    disjoint = DS(area, scratch)
+
+    # open the blocked cells in a random order, each cell is drawn at most once so no draw is wasted
+    # on a cell that is already traversable. Without a seed the order follows the random module
+    rng = np.random.default_rng(seed if seed is not None else random.getrandbits(64))
+    if scratch is None:
+        blocked = rng.permutation(np.arange(1, end, dtype=np.int32))
+    else:
+        blocked = np.memmap(
+            os.path.join(scratch, "blocked.i32"), dtype=np.int32, mode="w+", shape=(max(end - 1, 0),)
+        )
+        for first in range(0, blocked.size, CHUNK):
+            last = min(first + CHUNK, blocked.size)
+            blocked[first:last] = np.arange(first + 1, last + 1, dtype=np.int32)
+        # same order as permutation() gives for the same seed, shuffled in place on disk. Through a
+        # plain ndarray view, as shuffle takes a slow per element path for np.memmap
+        rng.shuffle(blocked.view(np.ndarray))
 
-    # while start and end are not in the same set, make a random cell traversable
-    while disjoint.find((0,0)) != disjoint.find((n-1,n-1)):
-        disjoint, area = traverse_random_cell(disjoint, area, n)
+    # while start and end are not in the same set, make the next blocked cell traversable
+    # the order is read a chunk at a time so it never becomes one huge python list
+    for first in range(0, blocked.size, CHUNK):
+        for cell in blocked[first : first + CHUNK].tolist():
+            if disjoint.find(start) == disjoint.find(end):
+                return area
+            open_cell(disjoint, flat, cols, cell, n)
 
     return area
 
-def traverse_random_cell(disjoint: DS, area: List[List[int]], n: int):
-    # pick a random cell that is not traversable and make it traversable
-    i, j = random.randint(0, n-1), random.randint(0, n-1)
-    # NOTE: I could make this more efficient by makeing a list or set of all not traversable cells,
-    # and taking random items from that collection so that we never end up choosing an already
-    # traversable cell
-    if area[i][j] == 0:
-        area[i][j] = 1
-
-        # look for clear neighbours 
-        clear_neighbours = []
-        directions = [(1,0), (-1,0), (0,1), (0,-1)]
-        for d in directions:
-            neighbour = (i + d[0], j + d[1])
-            # check if neighbour is within bounds and clear
-            if neighbour[0] >= 0 and neighbour[0] < n and neighbour[1] >= 0 and neighbour[1] < n:
-                if area[neighbour[0]][neighbour[1]] == 1:
-                    clear_neighbours.append(neighbour)
-        
-        # replace their sets with a union of the 2 sets
-        for c_n in clear_neighbours:
-            disjoint.union((i,j), c_n)
-
-    return disjoint, area
+def create_areas(n: int, seeds: Iterable[int]) -> np.ndarray:
+    """Generate one n x n area per seed, stacked into a (len(seeds), n, n) uint8 array."""
+    return np.stack([create_area(n, seed) for seed in seeds])
+
+def corners_connected(area) -> bool:
+    """Check that the top left and bottom right cells of an area are joined by traversable cells."""
+    area = np.asarray(area) != 0
+    rows, cols = area.shape
+    cells = np.arange(rows * cols, dtype=np.int32).reshape(rows, cols)
+    # every pair of horizontally or vertically adjacent traversable cells, unioned in one go
+    right = area[:, :-1] & area[:, 1:]
+    down = area[:-1, :] & area[1:, :]
+    pairs = np.concatenate([
+        np.stack([cells[:, :-1][right], cells[:, 1:][right]], axis=1),
+        np.stack([cells[:-1, :][down], cells[1:, :][down]], axis=1),
+    ])
+    disjoint = DS(area)
+    disjoint.union_many(pairs)
+    return bool(area[0, 0] and disjoint.connected(0, rows * cols - 1))
+
+def open_cell(disjoint: DS, flat, n: int, cell: int, rows: Optional[int] = None):
+    # make a cell traversable, cells are flat indices i * n + j into an area n cells wide and rows
+    # (n by default) cells high
+    rows = n if rows is None else rows
+    flat[cell] = 1
+    i, j = divmod(cell, n)
+
+    # replace the sets of clear neighbours with a union of the 2 sets, checking each neighbour is
+    # within bounds and clear
+    if i > 0 and flat[cell - n]:
+        disjoint.union(cell, cell - n)
+    if i < rows - 1 and flat[cell + n]:
+        disjoint.union(cell, cell + n)
+    if j > 0 and flat[cell - 1]:
+        disjoint.union(cell, cell - 1)
+    if j < n - 1 and flat[cell + 1]:
+        disjoint.union(cell, cell + 1)
 
 def weight_area(area: List[List[int]]) -> List[List[float]]:
     return [
         [float(c) * random.random() for c in row]
         for row in area
-    ]
\ No newline at end of file
+    ]
@@ -0,0 +1,96 @@
+"""
+Compact on-disk areas that are memory mapped rather than read into memory.
+
+An area file is a fixed size header followed by the cells as rows * cols uint8 bytes (0 = blocked,
+1 = open). The header holds the area's shape, the seed it was generated from and its density of open
+cells, so a file can be described without touching the cells.
+"""
+import os
+import struct
+import tempfile
+from typing import NamedTuple, Optional
+import numpy as np
+
+from area_generator import create_area
+
+MAGIC = b"ANTAREA1"
+# magic, rows, cols, seed (-1 if unknown), density of open cells
+HEADER = struct.Struct("<8sIIqd")
+# the cells start at a fixed offset so they can be memory mapped straight from the file
+DATA_OFFSET = 64
+# rows written at a time when saving, so a saved area is never fully materialised in memory
+ROW_CHUNK = 1024
+
+
+class AreaHeader(NamedTuple):
+    rows: int
+    cols: int
+    seed: Optional[int]
+    density: float
+
+
+def _write_header(f, header: AreaHeader):
+    f.seek(0)
+    seed = -1 if header.seed is None else header.seed
+    f.write(HEADER.pack(MAGIC, header.rows, header.cols, seed, header.density).ljust(DATA_OFFSET, b"\0"))
+
+
+def read_header(path: str) -> AreaHeader:
+    with open(path, "rb") as f:
+        magic, rows, cols, seed, density = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an area file")
+    return AreaHeader(rows, cols, None if seed < 0 else seed, density)
+
+
+def save_area(path: str, area, seed: Optional[int] = None) -> AreaHeader:
+    """Write an area (any 2d array like, including a np.memmap) to an area file, a few rows at a time."""
+    rows, cols = np.shape(area)
+    opened = 0
+    with open(path, "wb") as f:
+        _write_header(f, AreaHeader(rows, cols, seed, 0.0))
+        for first in range(0, rows, ROW_CHUNK):
+            cells = (np.asarray(area[first : first + ROW_CHUNK]) != 0).astype(np.uint8)
+            opened += int(cells.sum())
+            f.write(cells.tobytes())
+        header = AreaHeader(rows, cols, seed, opened / max(rows * cols, 1))
+        _write_header(f, header)
+    return header
+
+
+def load_area(path: str, mode="r") -> np.memmap:
+    """
+    Memory map the cells of an area file as a (rows, cols) uint8 array.
+
+    Args:
+        mode: np.memmap mode, "r" read only, "r+" to write changes back to the file, "c" copy on write
+    """
+    header = read_header(path)
+    return np.memmap(
+        path, dtype=np.uint8, mode=mode, offset=DATA_OFFSET, shape=(header.rows, header.cols)
+    )
+
+
+def create_area_file(path: str, n: int, seed: Optional[int] = None) -> np.memmap:
+    """
+    Generate an n x n area straight into an area file, for areas larger than memory.
+
+    The generator's working arrays live in temporary files next to it and are removed afterwards.
+
+    Returns:
+        the new area, memory mapped read only
+    """
+    with open(path, "wb") as f:
+        _write_header(f, AreaHeader(n, n, seed, 0.0))
+        f.truncate(DATA_OFFSET + n * n)
+
+    area = np.memmap(path, dtype=np.uint8, mode="r+", offset=DATA_OFFSET, shape=(n, n))
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as scratch:
+        create_area(n, seed, out=area, scratch=scratch)
+    area.flush()
+
+    opened = sum(int(area[first : first + ROW_CHUNK].sum()) for first in range(0, n, ROW_CHUNK))
+    del area
+    with open(path, "r+b") as f:
+        _write_header(f, AreaHeader(n, n, seed, opened / max(n * n, 1)))
+    return load_area(path)
@@ -0,0 +1,213 @@
+"""
+Benchmark the ant systems and A* across grid sizes, open cell densities, ant counts and generations.
+
+Run locally, e.g.
+
+    python benchmark.py --sizes 10 20 50 --densities 0.6 0.8 --ants 5 20 --generations 50 \
+        --output results.csv
+
+The vectorized engine pays off with many ants per generation, e.g. compare
+
+    python benchmark.py --sizes 20 --ants 20 200 --generations 5 --skip-memory --engine ants
+    python benchmark.py --sizes 20 --ants 20 200 --generations 5 --skip-memory --engine vectorized
+
+Every row records wall time, time per generation, tours per second, peak traced memory and the
+route length relative to the A* optimum, and rows are written as CSV or JSON (by output extension)
+so results can be compared between versions.
+"""
+import argparse
+import csv
+import itertools
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+
+from a_star import astar
+from area_generator import create_area
+from grid_graph import GridGraph
+from systems import SYSTEM_CLASSES, make_system as make_spec_system
+
+SYSTEMS = tuple(SYSTEM_CLASSES)
+# same settings main.py compares the systems with
+SYSTEM_PARAMS = {"alpha": 2.0, "beta": 1.0, "evaporation": 0.1}
+
+
+def make_area(size: int, density: float, seed: int) -> np.ndarray:
+    """
+    Generate a connected area, then open random blocked cells until density of the cells are open.
+
+    Generated areas already have the density they needed to connect, a lower density cannot be
+    reached and the area is returned as is.
+    """
+    area = create_area(size, seed)
+    blocked = np.flatnonzero(area.ravel() == 0)
+    missing = int(round(density * area.size)) - (area.size - blocked.size)
+    if missing > 0:
+        rng = np.random.default_rng(seed)
+        area.ravel()[rng.choice(blocked, size=min(missing, blocked.size), replace=False)] = 1
+    return area
+
+
+def make_system(name: str, area, ants: int, seed: int, **options):
+    if name not in SYSTEM_CLASSES:
+        raise ValueError(f"system must be one of {SYSTEMS}, but was {name}")
+    spec = {"system": name, "ants": ants, **SYSTEM_PARAMS}
+    if name == "ACS":
+        spec["init_pheromone"] = 0.02
+    return make_spec_system(spec, area, seed, **options)
+
+
+def _peak_memory(function) -> int:
+    """Peak bytes traced while running function, numpy buffers included."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_astar(area, graph: GridGraph, measure_memory=True) -> dict:
+    start = time.perf_counter()
+    path = astar(area, graph)
+    wall = time.perf_counter() - start
+    return {
+        "system": "A*",
+        "wall_time": wall,
+        "route_length": len(path) - 1 if path else None,
+        "peak_memory": _peak_memory(lambda: astar(area, graph)) if measure_memory else None,
+    }
+
+
+def bench_system(
+    name: str, area, ants: int, generations: int, seed: int, measure_memory=True, **options
+) -> dict:
+    start = time.perf_counter()
+    best = make_system(name, area, ants, seed, **options).run(generations)
+    wall = time.perf_counter() - start
+
+    # memory is traced in a second identical run as tracing slows down the timed one
+    peak = None
+    if measure_memory:
+        peak = _peak_memory(lambda: make_system(name, area, ants, seed, **options).run(generations))
+
+    return {
+        "system": name,
+        "wall_time": wall,
+        "generation_time": wall / generations,
+        "tours_per_second": ants * generations / wall,
+        "route_length": best.tour_score,
+        "peak_memory": peak,
+    }
+
+
+def run_benchmarks(
+    sizes: Iterable[int],
+    densities: Iterable[float],
+    ant_counts: Iterable[int],
+    generation_counts: Iterable[int],
+    systems: Iterable[str] = SYSTEMS,
+    repeats=1,
+    seed=0,
+    measure_memory=True,
+    callback: Optional[Callable[[Dict], None]] = None,
+    **options,
+) -> List[Dict]:
+    """
+    Benchmark every combination of the swept values.
+
+    Every area and its graph are built once per (size, density, repeat) and shared by A* and all
+    system runs on it. options are passed through to the systems, e.g. engine or workers.
+
+    Args:
+        callback: called with every ant system row as soon as it is measured, e.g. to report progress
+
+    Returns:
+        one row per run, ant system rows carry their route length relative to the A* optimum
+    """
+    rows = []
+    systems = list(systems)
+    for size, density, repeat in itertools.product(sizes, densities, range(repeats)):
+        area_seed = seed + repeat
+        area = make_area(size, density, area_seed)
+        graph = GridGraph(area)
+        common = {
+            "size": size,
+            "density": float(area.mean()),
+            "repeat": repeat,
+            "seed": area_seed,
+        }
+
+        optimum = bench_astar(area, graph, measure_memory)
+        rows.append({**common, **optimum})
+        for ants, generations, name in itertools.product(ant_counts, generation_counts, systems):
+            result = bench_system(
+                name, area, ants, generations, area_seed, measure_memory, graph=graph, **options
+            )
+            result["quality"] = result["route_length"] / optimum["route_length"]
+            rows.append({**common, "ants": ants, "generations": generations, **result})
+            if callback is not None:
+                callback(rows[-1])
+    return rows
+
+
+def _print_row(row: Dict):
+    print(
+        f"size={row['size']} density={row['density']:.2f} ants={row['ants']} "
+        f"generations={row['generations']} {row['system']}: {row['wall_time']:.3f}s, "
+        f"quality {row['quality']:.3f}"
+    )
+
+
+def write_results(rows: List[Dict], path: str):
+    """Write rows as JSON if path ends in .json, else as CSV."""
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+
+    fields = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.6, 0.8])
+    parser.add_argument("--ants", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--generations", type=int, nargs="+", default=[50])
+    parser.add_argument("--systems", nargs="+", choices=SYSTEMS, default=list(SYSTEMS))
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", default="ants")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--skip-memory", action="store_true", help="do not trace peak memory")
+    parser.add_argument("--output", default="benchmark.csv", help=".csv or .json file")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    rows = run_benchmarks(
+        args.sizes,
+        args.densities,
+        args.ants,
+        args.generations,
+        args.systems,
+        args.repeats,
+        args.seed,
+        not args.skip_memory,
+        _print_row,
+        engine=args.engine,
+        workers=args.workers,
+    )
+    write_results(rows, args.output)
+    print(f"wrote {len(rows)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+from typing import List, Optional
+import numpy as np
+
+from grid_graph import GridGraph
+from sampling import DRAW_BLOCK, AntStream
+
+# what an ant knows about a node: not entered yet, on its tour, or a dead end it backed out of
+FREE, VISITED, DEAD = 0, 1, 2
+# ants still building once this few are left are finished one at a time, see VectorizedColony
+HANDOFF = 32
+
+
+class VectorizedColony:
+    """
+    Tour construction engine that advances every ant of a colony together.
+
+    Instead of one Python Ant object stepping one cell at a time, the whole colony is held as arrays:
+    a position per ant, a state mask per ant marking visited and dead nodes, and a tour buffer per
+    ant. Every step scores the 4 neighbours of all active ants in one batch and samples the next cell
+    for each.
+
+    A step costs about the same however few ants take part in it, so once no more than handoff ants
+    are left each is handed to an Ant (or ACAnt) that carries on from the same tour, dead nodes and
+    place in its stream. Colonies with many ants per generation gain the most, see benchmark.py.
+
+    The move rules are the same as Ant.generate_solution: blocked, visited and dead cells are never
+    entered, a stuck ant backtracks up to backtrack_limit times and is then reset to the start.
+    """
+
+    def __init__(self, graph: GridGraph, alpha, beta, backtrack_limit=10, handoff=HANDOFF):
+        self.graph = graph
+        self.alpha = alpha
+        self.beta = beta
+        self.backtrack_limit = backtrack_limit
+        self.handoff = handoff
+        self.start = graph.start
+        self.goal = graph.goal
+        # ants work on node ids, blocked and out of bounds neighbours point at an extra sentinel node
+        # num_nodes that is always dead and weighs nothing. So do the area's dead ends (see
+        # GridGraph.dead_ends), as no ant should ever enter one. Kept where the graph keeps its table
+        table = graph.neighbour_table
+        self.neighbours = graph.allocate(table.shape, table.dtype)
+        for d in range(table.shape[1]):
+            column = table[:, d]
+            enter = (column >= 0) & ~graph.dead_ends[np.maximum(column, 0)]
+            self.neighbours[:, d] = np.where(enter, column, graph.num_nodes)
+        # total (moves, backtracks, resets) of the last construct() call
+        self.counts = (0, 0, 0)
+
+    def construct(
+        self,
+        trail_level: np.ndarray,
+        desirability: np.ndarray,
+        streams: List[AntStream],
+        exploitation_threshold: Optional[float] = None,
+    ) -> List[np.ndarray]:
+        """
+        Build a complete tour for every ant in the colony.
+
+        Args:
+            trail_level: pheromone level matrix, read only
+            desirability: move weight of every node, see pheromone.Desirability
+            streams: one AntStream per ant to build a tour for. The ants draw the same blocks of
+                numbers from them, in the same order, as Ant and ACAnt do, so they build the same tours
+            exploitation_threshold: ACS q value, if given an ant greedily takes the best move with
+                this probability instead of sampling one
+
+        Returns:
+            one array of node ids per ant, from the first move up to and including the goal
+        """
+        num_of_ants = len(streams)
+        nodes = self.graph.num_nodes
+        width = nodes + 1
+        weight_of = np.append(desirability, 0.0)
+        greedy_of = None
+        if exploitation_threshold is not None:
+            # trails do not change while tours are built, so every node's greedy score is read once.
+            # take() reads by flat index from a plain or lazily evaporated matrix alike
+            greedy_of = trail_level.take(self.graph.cells) * self.graph.attractiveness
+            greedy_of = np.append(greedy_of, -np.inf)
+
+        position = np.full(num_of_ants, self.start, dtype=np.int64)
+        state = np.zeros((num_of_ants, width), dtype=np.int8)
+        state[:, nodes] = DEAD
+        flat_state = state.ravel()
+        backtracks = np.zeros(num_of_ants, dtype=np.int64)
+        tour_len = np.zeros(num_of_ants, dtype=np.int64)
+        capacity = max(self.graph.rows + self.graph.cols, 16)
+        tours = np.empty((num_of_ants, capacity), dtype=np.int64)
+        # nodes found dead since the last reset, an ant backtracks at most backtrack_limit times
+        dead_log = np.empty((num_of_ants, self.backtrack_limit), dtype=np.int64)
+        dead_len = np.zeros(num_of_ants, dtype=np.int64)
+        active = np.arange(num_of_ants) if self.start != self.goal else np.arange(0)
+        moves = backtracked = restarted = 0
+
+        # every ant's pre-drawn uniforms, a move takes one (two for ACS, exploit then sample)
+        draws_per_move = 1 if exploitation_threshold is None else 2
+        draws = np.empty((num_of_ants, DRAW_BLOCK))
+        for a, stream in enumerate(streams):
+            draws[a] = stream.generator.random(DRAW_BLOCK)
+        next_draw = np.zeros(num_of_ants, dtype=np.int64)
+
+        while active.size > self.handoff:
+            # grow tour buffers before any ant can overflow them
+            if tour_len[active].max() >= tours.shape[1]:
+                tours = np.concatenate([tours, np.empty_like(tours)], axis=1)
+
+            candidates = self.neighbours[position[active]]
+            valid = flat_state[(active * width)[:, None] + candidates] == FREE
+            has_move = valid.any(axis=1)
+
+            # stuck ants backtrack or restart, exactly like Ant.generate_solution
+            if not has_move.all():
+                back, reset = self._handle_stuck(
+                    active[~has_move], position, flat_state, width, backtracks, tour_len, tours,
+                    dead_log, dead_len,
+                )
+                backtracked += back
+                restarted += reset
+
+            movers = active[has_move]
+            if movers.size:
+                if not has_move.all():
+                    valid = valid[has_move]
+                    candidates = candidates[has_move]
+                weights = np.where(valid, weight_of[candidates], 0.0)
+
+                # refill ants that used up their block, DRAW_BLOCK is even so ACS pairs never straddle two
+                for a in movers[next_draw[movers] == DRAW_BLOCK]:
+                    draws[a] = streams[a].generator.random(DRAW_BLOCK)
+                    next_draw[a] = 0
+                column = next_draw[movers]
+                next_draw[movers] += draws_per_move
+
+                if greedy_of is None:
+                    choice = self._sample(weights, valid, draws[movers, column])
+                else:
+                    choice = self._sample(weights, valid, draws[movers, column + 1])
+                    exploit = draws[movers, column] <= exploitation_threshold
+                    if exploit.any():
+                        greedy = np.where(valid, greedy_of[candidates], -np.inf).argmax(axis=1)
+                        choice = np.where(exploit, greedy, choice)
+
+                chosen = candidates[np.arange(movers.size), choice]
+                position[movers] = chosen
+                tours[movers, tour_len[movers]] = chosen
+                tour_len[movers] += 1
+                flat_state[movers * width + chosen] = VISITED
+                moves += movers.size
+
+            active = active[position[active] != self.goal]
+
+        finished = [tours[a, : tour_len[a]].copy() for a in range(num_of_ants)]
+        if active.size:
+            counts = self._finish_with_ants(
+                active, finished, trail_level, weight_of, streams, draws, next_draw,
+                exploitation_threshold, tours, tour_len, dead_log, dead_len, backtracks,
+            )
+            moves += counts[0]
+            backtracked += counts[1]
+            restarted += counts[2]
+
+        self.counts = (moves, backtracked, restarted)
+        return finished
+
+    def _sample(self, weights: np.ndarray, valid: np.ndarray, draws: np.ndarray) -> np.ndarray:
+        """
+        Pick one column per row proportionally to weights, uniformly over valid moves if all weights
+        are 0, the same way sampling.choose does for a single ant.
+        """
+        cumulative = np.cumsum(weights, axis=1)
+        empty = cumulative[:, -1] <= 0
+        if empty.any():
+            weights = np.where(empty[:, None], valid, weights)
+            cumulative = np.cumsum(weights, axis=1)
+        choice = (cumulative <= (draws * cumulative[:, -1])[:, None]).sum(axis=1)
+        # draw * total can round up to total, fall back on the last column that can be picked
+        over = choice == weights.shape[1]
+        if over.any():
+            choice[over] = weights.shape[1] - 1 - (weights[over, ::-1] > 0).argmax(axis=1)
+        return choice
+
+    def _handle_stuck(
+        self, stuck, position, flat_state, width, backtracks, tour_len, tours, dead_log, dead_len
+    ) -> tuple:
+        """Backtrack or reset every stuck ant, returning how many of each were done."""
+        can_backtrack = (backtracks[stuck] < self.backtrack_limit) & (tour_len[stuck] > 0)
+
+        # backtrack: mark current cell dead (it is the last tour cell) and step back to the one before
+        back = stuck[can_backtrack]
+        if back.size:
+            flat_state[back * width + position[back]] = DEAD
+            dead_log[back, dead_len[back]] = position[back]
+            dead_len[back] += 1
+            tour_len[back] -= 1
+            previous = tours[back, np.maximum(tour_len[back] - 1, 0)]
+            position[back] = np.where(tour_len[back] > 0, previous, self.start)
+            backtracks[back] += 1
+
+        # reset: throw the whole tour away and start again, only the nodes it marked are cleared
+        reset = stuck[~can_backtrack]
+        if reset.size:
+            flat_state[_marked(reset, tours, tour_len, width)] = FREE
+            flat_state[_marked(reset, dead_log, dead_len, width)] = FREE
+            tour_len[reset] = 0
+            dead_len[reset] = 0
+            position[reset] = self.start
+            backtracks[reset] = 0
+
+        return back.size, reset.size
+
+    def _finish_with_ants(
+        self,
+        remaining,
+        finished,
+        trail_level,
+        weight_of,
+        streams,
+        draws,
+        next_draw,
+        exploitation_threshold,
+        tours,
+        tour_len,
+        dead_log,
+        dead_len,
+        backtracks,
+    ) -> tuple:
+        """Build the rest of the remaining ants' tours one ant at a time, returning their counts."""
+        # imported here as the ant modules import this one
+        from ant_colony import ACAnt
+        from ant_system import Ant
+
+        if exploitation_threshold is None:
+            ant = Ant(self.graph, self.alpha, self.beta, self.backtrack_limit)
+        else:
+            ant = ACAnt(
+                None, self.graph, self.alpha, self.beta, exploitation_threshold,
+                self.backtrack_limit, local_update=False,
+            )
+        # the ants index real nodes only, so the sentinel on the end is never read
+        weights = memoryview(weight_of)
+        counts = [0, 0, 0]
+        for a in remaining.tolist():
+            streams[a].resume(draws[a], next_draw[a])
+            ant.resume(tours[a, : tour_len[a]].tolist(), dead_log[a, : dead_len[a]].tolist(), streams[a])
+            ant.generate_solution(trail_level, weights, int(backtracks[a]))
+            finished[a] = np.array(ant.tour_nodes, dtype=np.int64)
+            # the moves already counted here are the tour the ant was handed
+            counts[0] += ant.moves - int(tour_len[a])
+            counts[1] += ant.backtracks
+            counts[2] += ant.resets
+        return counts
+
+
+def _marked(rows: np.ndarray, entries: np.ndarray, lengths: np.ndarray, width: int) -> np.ndarray:
+    """Flat state index of the first lengths[row] entries of every row, e.g. the nodes of each tour."""
+    counts = lengths[rows]
+    owner = np.repeat(rows, counts)
+    offsets = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner * width + entries[owner, offsets]
@@ -1,38 +1,120 @@
-from typing import List
+from typing import List, Optional
+import os
+import numpy as np
+
+# cells written at a time when filling file backed arrays, so they are never materialised in memory
+CHUNK = 1 << 22
 
 # NOTE: impl using Galler-Fischer tree
 # src: https://en.wikipedia.org/wiki/Disjoint-set_data_structure
 class DS:
-    # NOTE: tried to flatten and it was a painnn
-    def __init__(self, area: List[List[int]]):
-        n = len(area)
-        self.parent = [[(i,j) for j in range(n)] for i in range(n)]
-        self.size = [[1] * n] * n
+    """
+    Disjoint set over the cells of an area, flattened to a single index i * cols + j (see index()).
 
-    # find set representative (roott of the tree in this case)
-    # TODO: implement path splitting or halving instead
-    def find(self, x: tuple[int,int]) -> tuple[int,int]:
-        if self.parent[x[0]][x[1]] != x:
-            self.parent[x[0]][x[1]] = self.find(self.parent[x[0]][x[1]])
-            return self.parent[x[0]][x[1]]
+    parent and size are int32 arrays. Single finds and unions step through them via memoryviews,
+    which are much cheaper than numpy scalar indexing in a python loop, while union_many() and
+    connected() work on whole arrays of cells at once.
+
+    For areas larger than memory, pass a scratch directory and parent and size are np.memmap files
+    in it instead.
+    """
+
+    def __init__(self, area: List[List[int]], scratch: Optional[str] = None):
+        self.rows, self.cols = np.shape(area)[:2]
+        cells = self.rows * self.cols
+        if scratch is None:
+            self.parent = np.arange(cells, dtype=np.int32)
+            self.size = np.ones(cells, dtype=np.int32)
         else:
-            return x
-        
+            self.parent = np.memmap(
+                os.path.join(scratch, "ds_parent.i32"), dtype=np.int32, mode="w+", shape=(cells,)
+            )
+            self.size = np.memmap(
+                os.path.join(scratch, "ds_size.i32"), dtype=np.int32, mode="w+", shape=(cells,)
+            )
+            for first in range(0, cells, CHUNK):
+                last = min(first + CHUNK, cells)
+                self.parent[first:last] = np.arange(first, last, dtype=np.int32)
+                self.size[first:last] = 1
+        self._parent = memoryview(self.parent)
+        self._size = memoryview(self.size)
+
+    def index(self, x: tuple[int,int]) -> int:
+        return x[0] * self.cols + x[1]
+
+    # find set representative (roott of the tree in this case)
+    # iterative with path halving, so long chains can never hit the recursion limit
+    def find(self, x: int) -> int:
+        parent = self._parent
+        while parent[x] != x:
+            # point x at its grandparent and skip ahead to it
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
     # union by size
-    def union(self, x: tuple[int,int], y: tuple[int,int]):
+    def union(self, x: int, y: int):
         # replace nodes by roots
         x = self.find(x)
         y = self.find(y)
 
         if x == y:
             return # return early as x and y are already in the same set !
-        
+
         # if necessary swap the vars so that x has at least as many descendants as y
-        if self.size[x[0]][x[1]] < self.size[y[0]][y[1]]:
+        size = self._size
+        if size[x] < size[y]:
             x, y = y, x
 
         # make x the new root / parent of y
-        self.parent[y[0]][y[1]] = x
+        self._parent[y] = x
         # update the size of x
-        self.size[x[0]][x[1]] = self.size[x[0]][x[1]] + self.size[y[0]][y[1]]
+        size[x] = size[x] + size[y]
+
+    def find_many(self, cells: np.ndarray) -> np.ndarray:
+        """Find the roots of an array of cells, compressing their paths to point straight at them."""
+        cells = np.asarray(cells, dtype=np.int32)
+        roots = self.parent[cells]
+        while True:
+            grandparents = self.parent[roots]
+            if np.array_equal(grandparents, roots):
+                break
+            roots = grandparents
+        self.parent[cells] = roots
+        return roots
+
+    def union_many(self, pairs: np.ndarray):
+        """
+        Union every (x, y) pair of cells in a (k, 2) array in one vectorized pass.
+
+        Roots are repeatedly hooked onto the smallest root they are paired with, and the whole forest
+        is flattened by pointer jumping after each round, until every pair shares a root. Hooking
+        always points at a smaller index so no cycles can form. Sizes are then recounted for every
+        root, so later single unions still work by size.
+        """
+        pairs = np.asarray(pairs, dtype=np.int32).reshape(-1, 2)
+        self._flatten()
+        while True:
+            x, y = self.parent[pairs[:, 0]], self.parent[pairs[:, 1]]
+            apart = x != y
+            if not apart.any():
+                break
+            pairs, x, y = pairs[apart], x[apart], y[apart]
+            np.minimum.at(self.parent, np.maximum(x, y), np.minimum(x, y))
+            self._flatten()
+
+        self.size[...] = np.bincount(self.parent, minlength=self.parent.size)
+
+    def _flatten(self):
+        """Point every cell straight at its root, doubling the distance jumped on each pass."""
+        while True:
+            grandparents = self.parent[self.parent]
+            if np.array_equal(grandparents, self.parent):
+                return
+            self.parent[...] = grandparents
 
+    def connected(self, a, b):
+        """Whether cells a and b are in the same set, element wise if given arrays of cells."""
+        if np.ndim(a) == 0 and np.ndim(b) == 0:
+            return self.find(int(a)) == self.find(int(b))
+        return self.find_many(np.atleast_1d(a)) == self.find_many(np.atleast_1d(b))
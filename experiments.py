@@ -0,0 +1,215 @@
+"""
+Run a grid of system configurations over many generated areas across a process pool.
+
+e.g. tune ACS and EAS on 20 areas, streaming results to results.jsonl:
+
+    python experiments.py --systems EAS ACS A* --size 30 --seeds 0-19 --alpha 1 2 --beta 1 3 \
+        --evaporation 0.05 0.1 --q 0.1 0.3 --output results.jsonl
+
+Results are appended to the output file as each job finishes, one JSON object per line. Running the
+same command again skips every job whose key is already in the file, so a crashed batch can resume.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from area_generator import create_area
+from parallel import attach_array, share_array
+
+SYSTEMS = ("AS", "EAS", "ACS", "MMAS", "A*")
+# parameters each system is swept over, init_pheromone and q only apply to ACS, p_best to MMAS
+SYSTEM_PARAMS = {
+    "AS": ("alpha", "beta", "evaporation", "elites"),
+    "EAS": ("alpha", "beta", "evaporation", "elites"),
+    "ACS": ("alpha", "beta", "evaporation", "init_pheromone", "q"),
+    "MMAS": ("alpha", "beta", "evaporation", "p_best"),
+    "A*": (),
+}
+# state of a pool worker, filled in once by _init_worker
+_WORKER = {}
+
+
+def expand_jobs(
+    systems: Iterable[str],
+    size: int,
+    seeds: Iterable[int],
+    grid: Dict[str, List],
+    ants=10,
+    generations=100,
+    patience: Optional[int] = None,
+) -> List[dict]:
+    """
+    Build one job per system, area seed and combination of the parameter values it uses.
+
+    Args:
+        grid: values to sweep per parameter name, e.g. {"alpha": [1.0, 2.0], "q": [0.3]}. Parameters a
+            system does not use are ignored for it, and parameters left out keep their defaults
+        patience: stop a run early once its best tour has not improved for this many generations
+
+    Returns:
+        jobs as plain dicts, each with a unique "key"
+    """
+    jobs = []
+    for system, seed in itertools.product(systems, seeds):
+        names = [name for name in SYSTEM_PARAMS[system] if name in grid]
+        for values in itertools.product(*(grid[name] for name in names)):
+            job = {"system": system, "size": size, "seed": seed, "params": dict(zip(names, values))}
+            if system != "A*":
+                job.update(ants=ants, generations=generations, patience=patience)
+            job["key"] = job_key(job)
+            jobs.append(job)
+    return jobs
+
+
+def job_key(job: dict) -> str:
+    """A key that is the same for the same job in any later batch, used to resume."""
+    return json.dumps({k: v for k, v in job.items() if k != "key"}, sort_keys=True)
+
+
+def completed_keys(path: str) -> set:
+    """Keys of every job with a result in a results file, a half written last line is ignored."""
+    keys = set()
+    if not os.path.exists(path):
+        return keys
+    with open(path) as f:
+        for line in f:
+            try:
+                keys.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                continue
+    return keys
+
+
+def run_experiments(jobs: List[dict], output: str, workers: Optional[int] = None) -> Iterator[dict]:
+    """
+    Run jobs across a process pool, appending each result to output as soon as it finishes.
+
+    Jobs already in output are skipped. Each area is generated once per (size, seed) here and shared
+    with the workers through shared memory, and every job is submitted on its own so idle workers
+    always pick up the next one. Results are yielded in the order they finish.
+    """
+    done = completed_keys(output)
+    jobs = [job for job in jobs if job["key"] not in done]
+    if not jobs:
+        return
+
+    blocks = []
+    areas = {}
+    for size, seed in sorted({(job["size"], job["seed"]) for job in jobs}):
+        _, areas[(size, seed)] = share_array(create_area(size, seed), blocks)
+
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(areas,)) as pool:
+            pending = {pool.submit(_run_job, job) for job in jobs}
+            with open(output, "a") as f:
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        f.write(json.dumps(result) + "\n")
+                        f.flush()
+                        yield result
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _init_worker(areas: dict):
+    _WORKER["areas"] = areas
+    _WORKER["blocks"] = []
+    # GridGraph of every area this worker has seen, built once and reused by all its jobs there
+    _WORKER["graphs"] = {}
+
+
+def _area(size: int, seed: int):
+    from grid_graph import GridGraph
+
+    graphs = _WORKER["graphs"]
+    if (size, seed) not in graphs:
+        area = attach_array(_WORKER["areas"][(size, seed)], _WORKER["blocks"])
+        graphs[(size, seed)] = (area, GridGraph(area))
+    return graphs[(size, seed)]
+
+
+def _run_job(job: dict) -> dict:
+    # imported here so only workers pay for loading the systems
+    from a_star import astar
+    from stopping import NoImprovement
+    from systems import make_system
+
+    area, graph = _area(job["size"], job["seed"])
+    result = {"key": job["key"], **{k: v for k, v in job.items() if k != "key"}}
+    started = time.perf_counter()
+
+    if job["system"] == "A*":
+        path = astar(area, graph)
+        result["best_score"] = len(path) - 1 if path else None
+        result["wall_time"] = time.perf_counter() - started
+        return result
+
+    # every system shares the worker's cached graph of the area rather than building its own
+    spec = {"system": job["system"], "ants": job["ants"], **job["params"]}
+    system = make_system(spec, area, job["seed"], graph=graph)
+
+    generations = []
+    stop = NoImprovement(job["patience"]) if job["patience"] else None
+    final = system.run(job["generations"], callback=generations.append, stop=stop)
+    result.update(
+        best_score=system.best_ant.tour_score,
+        final_score=final.tour_score,
+        generations_run=len(generations),
+        wall_time=time.perf_counter() - started,
+    )
+    return result
+
+
+def _seeds(text: str) -> List[int]:
+    """Parse '0-9' or '3' into a list of seeds."""
+    first, _, last = text.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--systems", nargs="+", choices=SYSTEMS, default=list(SYSTEMS))
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--seeds", nargs="+", type=_seeds, default=[[0]], help="e.g. 0-9 12")
+    parser.add_argument("--ants", type=int, default=10)
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--patience", type=int, help="stop runs with no improvement for this long")
+    for name, kind in [
+        ("alpha", float),
+        ("beta", float),
+        ("evaporation", float),
+        ("elites", int),
+        ("init_pheromone", float),
+        ("q", float),
+        ("p_best", float),
+    ]:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=kind, nargs="+")
+    parser.add_argument("--workers", type=int, help="pool size, all cores by default")
+    parser.add_argument("--output", default="experiments.jsonl")
+    args = parser.parse_args(argv)
+
+    grid = {
+        name: getattr(args, name)
+        for name in ("alpha", "beta", "evaporation", "elites", "init_pheromone", "q", "p_best")
+        if getattr(args, name) is not None
+    }
+    seeds = sorted({seed for seed_range in args.seeds for seed in seed_range})
+    jobs = expand_jobs(
+        args.systems, args.size, seeds, grid, args.ants, args.generations, args.patience
+    )
+
+    for finished, result in enumerate(run_experiments(jobs, args.output, args.workers), 1):
+        name = f"{result['system']} seed={result['seed']} {result['params']}"
+        print(f"{finished}: {name} -> {result['best_score']}")
+
+
+if __name__ == "__main__":
+    main()
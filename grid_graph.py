@@ -0,0 +1,241 @@
+import copy
+import tempfile
+from functools import cached_property
+from typing import List, Optional, Tuple
+import numpy as np
+
+# neighbour order used by ants when listing moves: up, down, left, right
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+DEGREE = len(DIRECTIONS)
+# rows of the area and nodes handled at a time while a graph is built, so neither a memory mapped area
+# nor the graph's own arrays are ever held in memory whole
+ROW_CHUNK = 1024
+NODE_CHUNK = 1 << 20
+
+
+def allocate(shape, dtype, scratch: Optional[str] = None, fill_value=None) -> np.ndarray:
+    """
+    An array in memory, or a np.memmap of an unnamed temporary file in the scratch directory.
+
+    The file has no name on disk, so it is removed with the last array that maps it.
+    """
+    if scratch is None or np.prod(shape) == 0:
+        array = np.empty(shape, dtype=dtype)
+    else:
+        with tempfile.TemporaryFile(dir=scratch) as f:
+            array = np.memmap(f, dtype=dtype, mode="w+", shape=shape)
+    if fill_value is not None:
+        array.fill(fill_value)
+    return array
+
+
+class GridGraph:
+    """
+    Adjacency index of the free cells of an area, built once and shared by ants, A* and rendering.
+
+    Free cells are numbered 0..num_nodes-1 in row-major order. Their 4-neighbourhoods are stored as a
+    (nodes, 4) table in DIRECTIONS order, already bounds checked and with -1 in place of blocked cells,
+    so consumers never redo those tests per step.
+
+    Attributes:
+        cells: flat (i * cols + j) cell index of every node, x and y are worked out from it
+        node_of_cell: node id of every flat cell index, -1 for blocked cells
+        attractiveness: attractiveness value of every node, as float32
+        neighbour_table: neighbour node ids of every node, -1 where there is none
+        adjacency: the same neighbours as Python lists
+        positions: (x, y) tuple of every node
+        table_view, cell_view: flat memoryviews of neighbour_table and cells, for code that steps one
+            node at a time. The neighbours of node v are table_view[v * DEGREE : (v + 1) * DEGREE]
+        goal_distance: moves from every node to the goal, -1 where the goal cannot be reached
+        dead_ends: nodes no route from start to goal can pass through, see _find_dead_ends
+
+    Index arrays are int32 whenever the area is small enough for it. adjacency and positions are only
+    built the first time they are used, as Python lists of a huge area can take more memory than the
+    arrays themselves. Ants and A* step through the memoryviews instead, so they never need them. The
+    area can be a np.memmap, it is only read a few rows at a time. Given a scratch directory, every
+    per node array (and those made with allocate(), e.g. by pheromone.Desirability) is a np.memmap of a
+    temporary file there, for areas larger than memory.
+
+    Routes run from start to goal, the top left and bottom right cells unless given. with_endpoints()
+    gives a graph for other endpoints that shares everything about the area with this one.
+    """
+
+    def __init__(
+        self,
+        area,
+        start: Optional[Tuple[int, int]] = None,
+        goal: Optional[Tuple[int, int]] = None,
+        scratch: Optional[str] = None,
+    ):
+        self.rows, self.cols = np.shape(area)
+        self.scratch = scratch
+        index = np.int32 if self.rows * self.cols < 2**31 else np.int64
+        firsts = range(0, self.rows, ROW_CHUNK)
+        counts = [int(np.count_nonzero(area[first : first + ROW_CHUNK])) for first in firsts]
+
+        self.num_nodes = sum(counts)
+        self.cells = self.allocate(self.num_nodes, index)
+        self.node_of_cell = self.allocate(self.rows * self.cols, index)
+        self.attractiveness = self.allocate(self.num_nodes, np.float32)
+        node = 0
+        for first, count in zip(firsts, counts):
+            block = np.asarray(area[first : first + ROW_CHUNK]).ravel()
+            found = np.flatnonzero(block)
+            lookup = np.full(block.size, -1, dtype=index)
+            lookup[found] = np.arange(node, node + count, dtype=index)
+            offset = first * self.cols
+            self.node_of_cell[offset : offset + block.size] = lookup
+            self.cells[node : node + count] = found + offset
+            self.attractiveness[node : node + count] = block[found]
+            node += count
+
+        self.neighbour_table = self._build_neighbour_table()
+
+        self._set_endpoints(start, goal)
+
+    def allocate(self, shape, dtype, fill_value=None) -> np.ndarray:
+        """An array kept wherever this graph keeps its own, see allocate()."""
+        return allocate(shape, dtype, self.scratch, fill_value)
+
+    def _set_endpoints(self, start: Optional[Tuple[int, int]], goal: Optional[Tuple[int, int]]):
+        self.start_position = (0, 0) if start is None else tuple(start)
+        self.goal_position = (self.rows - 1, self.cols - 1) if goal is None else tuple(goal)
+        for x, y in (self.start_position, self.goal_position):
+            if not (0 <= x < self.rows and 0 <= y < self.cols):
+                raise ValueError(f"({x}, {y}) is outside of the {self.rows}x{self.cols} area")
+        # -1 when the cell is blocked
+        self.start = self.node(self.start_position)
+        self.goal = self.node(self.goal_position)
+
+    def with_endpoints(
+        self, start: Optional[Tuple[int, int]] = None, goal: Optional[Tuple[int, int]] = None
+    ) -> "GridGraph":
+        """
+        The same area routed between other endpoints.
+
+        Node ids, the neighbour table and whatever adjacency or positions lists are already built are
+        shared rather than copied. Only dead_ends is worked out again, and goal_distance too if the goal
+        moved.
+        """
+        graph = copy.copy(self)
+        graph.__dict__.pop("dead_ends", None)
+        graph._set_endpoints(start, goal)
+        if graph.goal != self.goal:
+            graph.__dict__.pop("goal_distance", None)
+        return graph
+
+    @cached_property
+    def adjacency(self) -> List[List[int]]:
+        return [[v for v in row if v >= 0] for row in self.neighbour_table.tolist()]
+
+    @cached_property
+    def positions(self) -> List[Tuple[int, int]]:
+        xs, ys = self.coordinates(slice(None))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    @cached_property
+    def table_view(self) -> memoryview:
+        """neighbour_table as a flat memoryview, which indexes to Python ints without building any lists."""
+        return memoryview(self.neighbour_table.reshape(-1))
+
+    @cached_property
+    def cell_view(self) -> memoryview:
+        """cells as a memoryview, divmod(cell_view[v], cols) is the (x, y) of node v."""
+        return memoryview(self.cells)
+
+    @cached_property
+    def num_edges(self) -> int:
+        """Number of (node, neighbour) pairs, each edge counted once from either end."""
+        return sum(int(np.count_nonzero(self.neighbour_table[:, d] >= 0)) for d in range(DEGREE))
+
+    @cached_property
+    def goal_distance(self) -> np.ndarray:
+        """Breadth first search out from the goal, one frontier of nodes at a time."""
+        distance = self.allocate(self.num_nodes, self.node_of_cell.dtype, -1)
+        if self.goal < 0:
+            return distance
+        distance[self.goal] = 0
+        frontier = np.array([self.goal])
+        steps = 0
+        while frontier.size:
+            steps += 1
+            reached = self.neighbour_table[frontier].ravel()
+            reached = reached[reached >= 0]
+            frontier = np.unique(reached[distance[reached] < 0])
+            distance[frontier] = steps
+        return distance
+
+    @cached_property
+    def dead_ends(self) -> np.ndarray:
+        return self._find_dead_ends()
+
+    def _find_dead_ends(self) -> np.ndarray:
+        """
+        Mark the nodes that cannot be on a route from start to goal.
+
+        Nodes the goal cannot be reached from are dead. So is any other node with at most one live
+        neighbour, as a route that enters it can never leave it again. Removing such a node can leave
+        its neighbour with a single live neighbour too, so whole dead end corridors are peeled away
+        one layer at a time, only revisiting the neighbours of the nodes just removed.
+        """
+        table = self.neighbour_table
+        alive = self.allocate(self.num_nodes, bool)
+        np.greater_equal(self.goal_distance, 0, out=alive)
+        # one column at a time, a whole (nodes, 4) temporary is the largest array of the graph
+        degree = self.allocate(self.num_nodes, np.int8, 0)
+        for d in range(DEGREE):
+            column = table[:, d]
+            degree += (column >= 0) & alive[np.maximum(column, 0)]
+        endpoints = [v for v in (self.start, self.goal) if v >= 0]
+
+        removed = np.flatnonzero(alive & (degree <= 1))
+        removed = removed[~np.isin(removed, endpoints)]
+        while removed.size:
+            alive[removed] = False
+            touched = table[removed].ravel()
+            touched = touched[touched >= 0]
+            touched = touched[alive[touched]]
+            np.subtract.at(degree, touched, 1)
+            touched = np.unique(touched)
+            removed = touched[(degree[touched] <= 1) & ~np.isin(touched, endpoints)]
+        return np.logical_not(alive, out=alive)
+
+    def _build_neighbour_table(self) -> np.ndarray:
+        """Build a (nodes, 4) table of neighbour node ids, -1 where a neighbour is out of bounds or blocked."""
+        table = self.allocate((self.num_nodes, DEGREE), self.node_of_cell.dtype, -1)
+        for first in range(0, self.num_nodes, NODE_CHUNK):
+            x, y = self.coordinates(slice(first, first + NODE_CHUNK))
+            rows = table[first : first + NODE_CHUNK]
+            for d, (dx, dy) in enumerate(DIRECTIONS):
+                nx, ny = x + dx, y + dy
+                inside = (nx >= 0) & (nx < self.rows) & (ny >= 0) & (ny < self.cols)
+                rows[inside, d] = self.node_of_cell[nx[inside] * self.cols + ny[inside]]
+        return table
+
+    def node(self, position: Tuple[int, int]) -> int:
+        """Node id of an (x, y) position, -1 if the cell is blocked."""
+        return int(self.node_of_cell[position[0] * self.cols + position[1]])
+
+    def neighbours(self, node: int) -> np.ndarray:
+        row = self.neighbour_table[node]
+        return row[row >= 0]
+
+    def coordinates(self, nodes) -> Tuple[np.ndarray, np.ndarray]:
+        """x and y arrays of the nodes given as an index array or slice."""
+        return np.divmod(self.cells[nodes], self.cols)
+
+    def to_positions(self, nodes) -> List[Tuple[int, int]]:
+        cells, cols = self.cell_view, self.cols
+        return [divmod(cells[v], cols) for v in nodes]
+
+    def path_cost(self, nodes, weighted=False) -> float:
+        """
+        Score a path given as node ids.
+
+        Returns:
+            the number of moves, or with weighted=True the summed attractiveness of the entered
+            cells (the score to use for non binary areas)
+        """
+        if weighted:
+            return float(self.attractiveness[np.asarray(nodes, dtype=np.int64)].sum(dtype=np.float64))
+        return float(len(nodes))
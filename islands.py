@@ -0,0 +1,239 @@
+"""
+Run several colonies on the same area at once, one process each, migrating between them periodically.
+
+e.g. two ACS colonies with different q values next to an EAS and a MMAS colony:
+
+    python islands.py --size 30 --islands ACS:q=0.1 ACS:q=0.5 EAS:alpha=2 MMAS --interval 10 \
+        --generations 100
+
+Every interval generations the islands pause and migrate. With "best" the best tour of all islands
+deposits on every other island and becomes its best ant if it beats it. With "blend" every island
+mixes the mean pheromone matrix of the others into its own. The matrices are exchanged through shared
+memory, only tours and scores go through pipes. Colonies only sync once per interval rather than every
+generation, so adding islands scales search with the number of cores.
+"""
+import argparse
+import ast
+import traceback
+from multiprocessing import Pipe, Process
+from typing import Callable, List, Optional
+import numpy as np
+
+from ant_system import Ant
+from grid_graph import GridGraph
+from parallel import attach_array, share_array
+from sampling import colony_seed
+from systems import SYSTEM_CLASSES, make_system
+
+MIGRATIONS = ("best", "blend")
+
+
+class IslandModel:
+    """
+    Colonies of any system and parameters, each evolving in its own process on a shared area.
+
+    Islands are given as systems.make_system specs, e.g. {"system": "ACS", "ants": 20, "q": 0.1}.
+
+    Each island gets its own seed derived from the model's seed and its index, so a run is repeatable.
+    Every run() starts the islands afresh, only the best ant is kept across runs.
+    """
+
+    def __init__(
+        self,
+        area,
+        islands: List[dict],
+        interval=10,
+        migration="best",
+        blend=0.2,
+        seed=None,
+    ):
+        if not islands:
+            raise ValueError("at least one island is needed")
+        if interval < 1:
+            raise ValueError(f"interval must be 1 or greater, was {interval}")
+        if migration not in MIGRATIONS:
+            raise ValueError(f"migration must be one of {MIGRATIONS}, but was {migration}")
+        if not 0 <= blend <= 1:
+            raise ValueError(f"blend must be in range [0, 1], but was {blend}")
+        for island in islands:
+            if island.get("system") not in SYSTEM_CLASSES:
+                raise ValueError(f"island system must be one of {tuple(SYSTEM_CLASSES)}: {island}")
+
+        self.area = np.asarray(area)
+        self.graph = GridGraph(self.area)
+        self.islands = [dict(island) for island in islands]
+        self.interval = interval
+        self.migration = migration
+        self.blend = blend
+        self.seed = colony_seed(seed)
+        # best ant of every island and of the whole model, node ids are the same in every process
+        self.island_best: List[Optional[Ant]] = [None] * len(islands)
+        self.best_ant: Optional[Ant] = None
+
+    def run(
+        self, generations: int, callback: Optional[Callable[[int, List[float]], None]] = None
+    ) -> Ant:
+        """
+        Run every island for a number of generations, migrating every interval generations.
+
+        Args:
+            callback: called after every migration round with the number of generations run so far
+                and the best score of every island
+
+        Returns:
+            the best ant found on any island
+        """
+        blocks = []
+        # one pheromone buffer per island and epoch parity, so an island that starts the next epoch
+        # early never overwrites a matrix another island is still blending in
+        shape = self.area.shape
+        _, area = share_array(self.area, blocks)
+        buffers = [
+            [share_array(np.zeros(shape), blocks)[1] for _ in self.islands] for _ in range(2)
+        ]
+
+        connections, processes = [], []
+        try:
+            for index, island in enumerate(self.islands):
+                parent, child = Pipe()
+                seed = int(np.random.SeedSequence([self.seed, index]).generate_state(1)[0])
+                process = Process(
+                    target=_island_main,
+                    args=(child, index, island, seed, area, buffers, self.migration, self.blend),
+                    daemon=True,
+                )
+                process.start()
+                child.close()
+                connections.append(parent)
+                processes.append(process)
+
+            done, epoch, migrant = 0, 0, None
+            while done < generations:
+                steps = min(self.interval, generations - done)
+                for connection in connections:
+                    connection.send((epoch, steps, migrant))
+                results = [_receive(connection) for connection in connections]
+                done += steps
+
+                for index, (nodes, score) in enumerate(results):
+                    self.island_best[index] = Ant(self.graph, 1.0, 1.0).load_tour(nodes)
+                    self.island_best[index].tour_score = score
+                best = min(self.island_best, key=lambda a: a.tour_score)
+                if self.best_ant is None or best.tour_score < self.best_ant.tour_score:
+                    self.best_ant = best
+                migrant = self.best_ant.tour_nodes.tolist()
+                if callback is not None:
+                    callback(done, [a.tour_score for a in self.island_best])
+                epoch += 1
+
+            for connection in connections:
+                connection.send(None)
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        return self.best_ant
+
+
+def _receive(connection):
+    message = connection.recv()
+    if isinstance(message, str):
+        # an island failed, its traceback is passed on
+        raise RuntimeError(f"island failed:\n{message}")
+    return message
+
+
+def _island_main(
+    connection,
+    index: int,
+    island: dict,
+    seed: int,
+    area: tuple,
+    buffers: list,
+    migration: str,
+    blend: float,
+):
+    blocks = []
+    try:
+        system = make_system(island, attach_array(area, blocks), seed)
+        own = [attach_array(parity[index], blocks) for parity in buffers]
+        others = [
+            [attach_array(description, blocks) for i, description in enumerate(parity) if i != index]
+            for parity in buffers
+        ]
+
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            epoch, steps, migrant = message
+            if epoch:
+                _migrate(system, migration, blend, migrant, others[(epoch - 1) % 2])
+
+            system.run(steps)
+            own[epoch % 2][...] = np.asarray(system.pher_mat)
+            connection.send((system.best_ant.tour_nodes.tolist(), system.best_ant.tour_score))
+    except Exception:
+        connection.send(traceback.format_exc())
+    finally:
+        connection.close()
+
+
+def _migrate(system, migration: str, blend: float, migrant: List[int], others: List[np.ndarray]):
+    if migration == "best":
+        if system.best_ant is None or migrant != system.best_ant.tour_nodes.tolist():
+            system.accept_migrant(migrant)
+    elif others:
+        mixed = (1 - blend) * np.asarray(system.pher_mat) + blend * np.mean(others, axis=0)
+        system.warm_start(mixed)
+
+
+def _parse_island(text: str) -> dict:
+    """Parse 'ACS:q=0.1,ants=20,engine=vectorized' into an island spec."""
+    system, _, options = text.partition(":")
+    island = {"system": system}
+    for option in filter(None, options.split(",")):
+        name, _, value = option.partition("=")
+        try:
+            island[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            island[name] = value
+    return island
+
+
+def main(argv: Optional[List[str]] = None):
+    from area_generator import create_area
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--area-seed", type=int)
+    parser.add_argument("--islands", nargs="+", type=_parse_island, required=True)
+    parser.add_argument("--interval", type=int, default=10)
+    parser.add_argument("--migration", choices=MIGRATIONS, default="best")
+    parser.add_argument("--blend", type=float, default=0.2)
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    model = IslandModel(
+        create_area(args.size, args.area_seed),
+        args.islands,
+        args.interval,
+        args.migration,
+        args.blend,
+        args.seed,
+    )
+    best = model.run(
+        args.generations, callback=lambda done, scores: print(f"generation {done}: {scores}")
+    )
+    print(f"best route length = {best.tour_score}")
+
+
+if __name__ == "__main__":
+    main()
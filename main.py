@@ -2,6 +2,7 @@ from a_star import astar
 from ant_colony import AntColony
 from ant_system import AntSystem, ElitistAntSystem
 from area_generator import create_area
+from max_min_ant_system import MaxMinAntSystem
 from print_utils import pprint_area, pprint_tour
 
 
@@ -17,8 +18,9 @@ def main():
     ACS = AntColony(
         area, num_of_ants=3, alpha=2.0, beta=1.0, evaporation=0.1, init_pheromone=0.02
     )
+    MMAS = MaxMinAntSystem(area, num_of_ants=3, alpha=2.0, beta=1.0, evaporation=0.1)
 
-    systems = {"AS": AS, "EAS": EAS, "ACS": ACS}
+    systems = {"AS": AS, "EAS": EAS, "ACS": ACS, "MMAS": MMAS}
     best_ants = []
     for name, s in systems.items():
         best_ant = s.run(100)
@@ -38,6 +40,8 @@ def main():
         print("elitist ant system route")
     elif best_system == "ACS":
         print("ant colony route")
+    elif best_system == "MMAS":
+        print("max-min ant system route")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+from typing import List
+import numpy as np
+from ant_system import Ant, AntSystem
+from pheromone import LazyPheromoneMatrix
+
+
+class MaxMinAntSystem(AntSystem):
+    """
+    MAX-MIN Ant System: a single ant deposits each generation and trails are kept within bounds.
+
+    Only the generation's best ant deposits, except every global_best_every generations when the best
+    ant of the run does instead. After every update the trails are clamped to [tau_min, tau_max], so
+    no cell can become so unattractive that it is never tried again. tau_max = 1 / (evaporation * best
+    score) follows the best tour found so far, and tau_min is set so that an ant rebuilds the best tour
+    with probability p_best once the trails have converged on it.
+
+    Trails start at an upper bound of tau_max, and are set back to tau_max whenever the best tour has
+    not improved for restart_after generations, so a stagnated colony explores again.
+    """
+
+    def __init__(
+        self,
+        area,
+        num_of_ants: int,
+        alpha=1.0,
+        beta=1.0,
+        evaporation=0.02,
+        p_best=0.05,
+        global_best_every=10,
+        restart_after=50,
+        engine="ants",
+        workers=1,
+        seed=None,
+        lazy_evaporation=False,
+        pheromone_dtype=float,
+        pheromone_file=None,
+        goal_guidance=False,
+        start=None,
+        goal=None,
+        graph=None,
+    ):
+        # elites is 1, only a single ant deposits each generation
+        super().__init__(
+            area,
+            num_of_ants,
+            1,
+            alpha,
+            beta,
+            evaporation,
+            engine,
+            workers,
+            seed,
+            lazy_evaporation,
+            pheromone_dtype,
+            pheromone_file,
+            goal_guidance,
+            start,
+            goal,
+            graph,
+        )
+        self._validate_mmas_values(evaporation, p_best, global_best_every, restart_after)
+        self.p_best = p_best
+        self.global_best_every = global_best_every
+        self.restart_after = restart_after
+        # no tour is shorter than the manhattan distance, so this bounds tau_max until one is found
+        (sx, sy), (gx, gy) = self.graph.start_position, self.graph.goal_position
+        shortest = max(abs(gx - sx) + abs(gy - sy), 1)
+        self.tau_max = 1.0 / (evaporation * shortest)
+        self.tau_min = 0.0
+        self.pher_mat.fill(self.tau_max)
+        # generations since the best tour last improved, and how often the trails have been reset
+        self._since_improvement = 0
+        self._best_score = float("inf")
+        self.restarts = 0
+
+    def _validate_mmas_values(self, evaporation, p_best, global_best_every, restart_after):
+        if evaporation <= 0:
+            raise ValueError("Evaporation must be greater than 0 for tau_max to be bounded")
+        if not 0 < p_best < 1:
+            raise ValueError(f"p_best must be in range (0, 1), but was {p_best}")
+        if global_best_every < 0:
+            raise ValueError(f"global_best_every must be 0 or greater, was {global_best_every}")
+        if restart_after < 1:
+            raise ValueError(f"restart_after must be 1 or greater, was {restart_after}")
+
+    def _state_params(self) -> dict:
+        return {
+            **super()._state_params(),
+            "p_best": self.p_best,
+            "global_best_every": self.global_best_every,
+            "restart_after": self.restart_after,
+        }
+
+    def _run_state(self) -> dict:
+        return {
+            "tau_max": self.tau_max,
+            "tau_min": self.tau_min,
+            "since_improvement": self._since_improvement,
+            "best_score": self._best_score,
+            "restarts": self.restarts,
+        }
+
+    def _load_run_state(self, state: dict) -> None:
+        self.tau_max = state["tau_max"]
+        self.tau_min = state["tau_min"]
+        self._since_improvement = state["since_improvement"]
+        self._best_score = state["best_score"]
+        self.restarts = state["restarts"]
+
+    def _initial_pheromone(self) -> float:
+        return self.tau_max
+
+    def _elite_ants(self, ants: List[Ant]) -> List[Ant]:
+        # _generation has already moved on to the next generation by the time the trails are updated
+        if self.global_best_every and self._generation % self.global_best_every == 0:
+            return [self.best_ant]
+        return ants[:1]
+
+    def _pheromone_update(self, ants: List[Ant]) -> None:
+        super()._pheromone_update(ants)
+        self._update_bounds()
+
+        if self.best_ant.tour_score < self._best_score:
+            self._best_score = self.best_ant.tour_score
+            self._since_improvement = 0
+        else:
+            self._since_improvement += 1
+
+        if self._since_improvement >= self.restart_after:
+            self.pher_mat.fill(self.tau_max)
+            self.desirability.invalidate()
+            self._since_improvement = 0
+            self.restarts += 1
+        else:
+            self._clamp()
+
+    def accept_migrant(self, nodes) -> bool:
+        # a migrant deposits on top of the trails, which must stay within bounds like any deposit
+        accepted = super().accept_migrant(nodes)
+        self._clamp()
+        return accepted
+
+    def _clamp(self):
+        if isinstance(self.pher_mat, LazyPheromoneMatrix):
+            self.pher_mat.clip(self.tau_min, self.tau_max)
+        else:
+            np.clip(self.pher_mat, self.tau_min, self.tau_max, out=self.pher_mat)
+        # clamping moves some trails and not others, so every weight is worked out again
+        self.desirability.invalidate()
+
+    def _update_bounds(self):
+        """Derive tau_max and tau_min from the best tour of the run so far."""
+        score = self.best_ant.tour_score
+        self.tau_max = 1.0 / (self.evaporation * score)
+        # an ant makes about score decisions, each between the moves a cell has left after entering it
+        choices = max(self.graph.num_edges / max(self.graph.num_nodes, 1) - 1, 2.0)
+        root = self.p_best ** (1.0 / max(score, 1.0))
+        self.tau_min = min(self.tau_max * (1 - root) / ((choices - 1) * root), self.tau_max)
@@ -0,0 +1,139 @@
+from typing import List
+import numpy as np
+
+# the per generation values that MetricsRecorder.totals adds up
+SUMMED = (
+    "construction_time",
+    "sort_time",
+    "pheromone_time",
+    "local_update_time",
+    "moves",
+    "backtracks",
+    "resets",
+)
+
+
+class GenerationMetrics:
+    """
+    What one generation of a run cost, passed to the callback given to run().
+
+    Attributes:
+        generation: index of the generation within the run
+        construction_time: seconds spent building tours, excluding batched ACS local updates
+        sort_time: seconds spent ranking the ants
+        pheromone_time: seconds spent in the global pheromone update
+        local_update_time: seconds spent in batched ACS local updates. Sequential ones are applied as
+            the ants move, so their cost is part of construction_time instead
+        moves: cells entered by all ants, including moves later undone by backtracks or resets
+        backtracks: steps taken back out of dead ends
+        resets: tours thrown away and restarted from the start
+        best_score, mean_score: tour scores of the generation's ants
+    """
+
+    __slots__ = (
+        "generation",
+        "construction_time",
+        "sort_time",
+        "pheromone_time",
+        "local_update_time",
+        "moves",
+        "backtracks",
+        "resets",
+        "best_score",
+        "mean_score",
+    )
+
+    def __init__(
+        self,
+        generation: int,
+        construction_time: float,
+        sort_time: float,
+        pheromone_time: float,
+        local_update_time: float,
+        moves: int,
+        backtracks: int,
+        resets: int,
+        best_score: float,
+        mean_score: float,
+    ):
+        self.generation = generation
+        self.construction_time = construction_time
+        self.sort_time = sort_time
+        self.pheromone_time = pheromone_time
+        self.local_update_time = local_update_time
+        self.moves = moves
+        self.backtracks = backtracks
+        self.resets = resets
+        self.best_score = best_score
+        self.mean_score = mean_score
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.as_dict().items())
+        return f"GenerationMetrics({fields})"
+
+
+class MetricsRecorder:
+    """run() callback that keeps the metrics of every generation, e.g. run(100, callback=recorder)."""
+
+    def __init__(self):
+        self.generations: List[GenerationMetrics] = []
+
+    def __call__(self, metrics: GenerationMetrics):
+        self.generations.append(metrics)
+
+    def totals(self) -> dict:
+        """Sum the times and counts of all recorded generations, and report the best score seen."""
+        totals = {name: sum(getattr(m, name) for m in self.generations) for name in SUMMED}
+        totals["best_score"] = min((m.best_score for m in self.generations), default=None)
+        return totals
+
+
+class GenerationRecord:
+    """
+    Lightweight result of one generation, yielded by iter_generations().
+
+    Attributes:
+        generation: index of the generation within the run
+        best_tour: node ids of the generation's best tour, an int32 array owned by the record
+        best_score, mean_score: tour scores of the generation's ants
+        run_best_score: score of the best tour seen so far in the run
+        improved: whether this generation's best tour is the best seen so far
+        elapsed: seconds the generation took
+    """
+
+    __slots__ = (
+        "generation",
+        "best_tour",
+        "best_score",
+        "mean_score",
+        "run_best_score",
+        "improved",
+        "elapsed",
+    )
+
+    def __init__(
+        self,
+        generation: int,
+        best_tour: np.ndarray,
+        best_score: float,
+        mean_score: float,
+        run_best_score: float,
+        improved: bool,
+        elapsed: float,
+    ):
+        self.generation = generation
+        self.best_tour = best_tour
+        self.best_score = best_score
+        self.mean_score = mean_score
+        self.run_best_score = run_best_score
+        self.improved = improved
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return (
+            f"GenerationRecord(generation={self.generation}, best_score={self.best_score}, "
+            f"run_best_score={self.run_best_score}, tour_len={len(self.best_tour)})"
+        )
@@ -0,0 +1,171 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List
+import numpy as np
+
+from sampling import AntStream
+
+CHUNKS_PER_WORKER = 4
+# state of a pool worker, filled in once by _init_worker
+_WORKER = {}
+
+
+class ParallelConstructor:
+    """
+    Builds the tours of a generation across a process pool.
+
+    The pheromone and attractiveness matrices live in shared memory, as do the move weights of the
+    system's pheromone.Desirability. attractiveness is copied in once, pher_mat and the weights at the
+    start of every generation, and workers only ever read them. Ants are split into small contiguous
+    chunks that idle workers pick up as they finish, and every ant draws from its own
+    sampling.AntStream, so results are the same for any number of workers.
+
+    For ACS, ants built in parallel do not write local updates while they move. They all read the
+    trails from the start of the generation and the caller applies their local updates afterwards
+    as one order-independent batch, just as a colony built without workers does (see
+    AntColony._get_solutions), so workers change nothing about its results.
+    """
+
+    def __init__(self, system, workers: int):
+        self.workers = workers
+        self.ant_num = system.ant_num
+        # total (moves, backtracks, resets) of the last construct() call
+        self.counts = (0, 0, 0)
+        self._blocks = []
+        self.pher_mat, pher_mat_block = self._share(system.pher_mat)
+        _, attractiveness_block = self._share(system.attractiveness)
+        self.desirability, desirability_block = self._share(system.desirability.values)
+
+        params = {
+            "alpha": system.alpha,
+            "beta": system.beta,
+            "seed": system.seed,
+            "start": system.graph.start_position,
+            "goal": system.graph.goal_position,
+            "scratch": system.graph.scratch,
+            "q": getattr(system, "q", None),
+        }
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(pher_mat_block, attractiveness_block, desirability_block, params),
+        )
+
+    def _share(self, array: np.ndarray) -> tuple:
+        return share_array(array, self._blocks)
+
+    def construct(
+        self, pher_mat: np.ndarray, desirability: np.ndarray, generation: int
+    ) -> List[np.ndarray]:
+        """
+        Build one tour per ant using the current pheromone levels and move weights.
+
+        Returns:
+            one array of visited node ids per ant, in ant index order
+        """
+        self.pher_mat[...] = pher_mat
+        self.desirability[...] = desirability
+
+        # a few chunks per worker so one slow ant does not hold up a whole worker's share
+        chunks = np.array_split(np.arange(self.ant_num), self.workers * CHUNKS_PER_WORKER)
+        jobs = [
+            self.pool.submit(_build_tours, generation, chunk.tolist())
+            for chunk in chunks
+            if chunk.size
+        ]
+
+        tours = []
+        counts = np.zeros(3, dtype=np.int64)
+        for job in jobs:
+            chunk_tours, chunk_counts = job.result()
+            tours.extend(chunk_tours)
+            counts += chunk_counts
+        self.counts = tuple(counts.tolist())
+        return tours
+
+    def close(self):
+        self.pool.shutdown()
+        # drop our views before releasing the memory they point into
+        self.pher_mat = self.desirability = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def share_array(array: np.ndarray, blocks: list) -> tuple:
+    """
+    Copy an array into a new shared memory block, added to blocks so the caller can release it later.
+
+    Returns:
+        a view onto the shared copy, and the (name, shape, dtype) a worker needs to attach to it
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return shared, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(description: tuple, blocks: list) -> np.ndarray:
+    """View a block made by share_array, which is added to blocks so it stays open while in use."""
+    name, shape, dtype = description
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _attach(description: tuple) -> np.ndarray:
+    return attach_array(description, _WORKER.setdefault("blocks", []))
+
+
+def _init_worker(pher_mat: tuple, attractiveness: tuple, desirability: tuple, params: dict):
+    from grid_graph import GridGraph
+
+    _WORKER["pher_mat"] = _attach(pher_mat)
+    _WORKER["desirability"] = _attach(desirability)
+    # every worker builds the area's graph once and reuses it for all its ants
+    _WORKER["graph"] = GridGraph(
+        _attach(attractiveness), params["start"], params["goal"], params["scratch"]
+    )
+    _WORKER.update(params)
+    # the shared weights as a Python list, and the generation it was last read for
+    _WORKER["weights"] = None
+    _WORKER["generation"] = None
+
+
+def _build_tours(generation: int, indices: List[int]) -> tuple:
+    # imported here as the ant modules import this one
+    from ant_colony import ACAnt
+    from ant_system import Ant
+
+    pher_mat, graph = _WORKER["pher_mat"], _WORKER["graph"]
+    alpha, beta, q = _WORKER["alpha"], _WORKER["beta"], _WORKER["q"]
+
+    # a single ant per worker is reset and reused for every tour it builds
+    ant = _WORKER.get("ant")
+    if ant is None:
+        if q is None:
+            ant = Ant(graph, alpha, beta)
+        else:
+            ant = ACAnt(None, graph, alpha, beta, q, local_update=False)
+        _WORKER["ant"] = ant
+
+    # a worker picks up several chunks per generation, but only the first one reads the weights
+    if _WORKER["generation"] != generation:
+        _WORKER["weights"] = _WORKER["desirability"].tolist()
+        _WORKER["generation"] = generation
+    weights = _WORKER["weights"]
+
+    tours = []
+    counts = [0, 0, 0]
+    for i in indices:
+        ant.reset(AntStream.for_ant(_WORKER["seed"], generation, i))
+        ant.generate_solution(pher_mat, weights)
+        tours.append(np.array(ant.tour_nodes, dtype=np.int32))
+        counts[0] += ant.moves
+        counts[1] += ant.backtracks
+        counts[2] += ant.resets
+    # the chunk's tours, and its total moves, backtracks and resets for run() metrics
+    return tours, counts
@@ -0,0 +1,168 @@
+import numpy as np
+
+# dtype of LazyPheromoneMatrix.stamps
+STAMP_DTYPE = np.int32
+
+
+class LazyPheromoneMatrix:
+    """
+    Pheromone matrix that evaporates lazily.
+
+    Every cell stores the level it had when it was last written and the generation it was written
+    in. Evaporation only bumps the generation counter, and the (1 - evaporation)^k decay for the k
+    generations since the last write is applied when a cell is read. A generation therefore costs
+    O(cells touched) instead of O(rows * cols), which pays off on large, mostly blocked grids where
+    ants only ever touch a small part of the area.
+
+    Supports the indexing the ants and systems use on a plain matrix: pher_mat[i, j], boolean masks
+    and (rows, cols) index arrays, plus np.asarray(pher_mat) to get the evaporated matrix.
+    """
+
+    def __init__(
+        self, shape, evaporation: float, fill_value=0.0, dtype=float, values=None, stamps=None
+    ):
+        # values and stamps can be handed in preallocated, e.g. as np.memmaps for areas larger than
+        # memory. Stamps are generation numbers, int32 (STAMP_DTYPE) lasts for 2**31 of them
+        if values is None:
+            values = np.empty(shape, dtype=dtype)
+        if stamps is None:
+            stamps = np.empty(shape, dtype=STAMP_DTYPE)
+        self.values = values
+        self.values.fill(fill_value)
+        self.stamps = stamps
+        self.stamps.fill(0)
+        self.retain = 1.0 - evaporation
+        self.generation = 0
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __getitem__(self, key):
+        return self.values[key] * self.retain ** (self.generation - self.stamps[key])
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+        self.stamps[key] = self.generation
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_array().astype(dtype or self.values.dtype, copy=False)
+
+    def take(self, flat_indices):
+        """Read cells by their flat index, like ndarray.take."""
+        exponent = self.generation - self.stamps.take(flat_indices)
+        return self.values.take(flat_indices) * self.retain**exponent
+
+    def to_array(self) -> np.ndarray:
+        """Return the fully evaporated matrix as a regular array."""
+        return self.values * self.retain ** (self.generation - self.stamps)
+
+    def fill(self, value):
+        self.values.fill(value)
+        self.stamps.fill(self.generation)
+
+    def clip(self, lower: float, upper: float):
+        """Bound every cell's level, which touches every cell and so costs a full pass."""
+        np.clip(self.to_array(), lower, upper, out=self.values)
+        self.stamps.fill(self.generation)
+
+    def evaporate(self):
+        """Start a new generation, every untouched cell now decays by one more step."""
+        self.generation += 1
+
+    def deposit(self, rows: np.ndarray, cols: np.ndarray, amounts: np.ndarray):
+        """Add amounts to the (rows, cols) cells, repeated cells accumulate like np.add.at."""
+        flat_indices = np.ravel_multi_index((rows, cols), self.shape)
+        cells, inverse = np.unique(flat_indices, return_inverse=True)
+        levels = self.take(cells)
+        np.add.at(levels, inverse, amounts)
+        np.put(self.values, cells, levels)
+        np.put(self.stamps, cells, self.generation)
+
+
+class Desirability:
+    """
+    tau^alpha * eta^beta of every node of a graph, the move weight ants sample from.
+
+    eta^beta only depends on the area, so it is computed once. Ants pick moves in proportion to these
+    weights (or take the largest), so scaling every weight by the same factor changes nothing, and
+    evaporation does exactly that: it scales every trail, and so every weight, by (1 - evaporation)^alpha.
+    evaporate() only counts it, and after a deposit or local update just the touched nodes are worked
+    out again, scaled up by the evaporations counted so far so they fit in with the rest. A generation
+    thus costs O(nodes touched), as with a LazyPheromoneMatrix. Anything that changes trails unevenly
+    (clamping, filling, warm starts) calls invalidate() instead, and the next sync() recomputes every
+    node in one vectorized pass.
+
+    weights holds the same values as a Python list, as ants stepping one node at a time read it far
+    faster than the array. It is only kept with keep_list=True.
+
+    With goal_guidance=True eta is also divided by 1 + the node's distance to the goal, which steers
+    ants towards the goal before the trails have anything to say. On binary areas beta then only sets
+    how strongly they are steered.
+    """
+
+    def __init__(self, graph, alpha, beta, goal_guidance=False, evaporation=0.0, keep_list=True):
+        self.graph = graph
+        self.alpha = alpha
+        # per node arrays are kept where the graph keeps its own, see GridGraph.allocate
+        eta = graph.attractiveness.astype(np.float64)
+        if goal_guidance:
+            eta /= 1.0 + np.maximum(graph.goal_distance, 0)
+        self.heuristic = graph.allocate(graph.num_nodes, np.float64)
+        self.heuristic[...] = eta**beta
+        self.retain = 1.0 - evaporation
+        self.keep_list = keep_list
+        self.values = graph.allocate(graph.num_nodes, np.float64, 0.0)
+        self.weights = self.values.tolist() if keep_list else None
+        # trails are read as float64 whatever dtype they are stored in, and the evaporation scale is
+        # folded into the values with a full refresh while it leaves half the exponent range to spare
+        self.max_scale = float(np.sqrt(np.finfo(self.values.dtype).max))
+        # trails are scaled up by this to match the level values were last fully refreshed at
+        self.scale = 1.0
+        self.stale = True
+
+    def refresh(self, trail_level) -> "Desirability":
+        """Recompute every node from a plain or lazily evaporated pheromone matrix."""
+        # take() reads by flat index from either kind of matrix
+        levels = trail_level.take(self.graph.cells).astype(np.float64, copy=False)
+        np.multiply(levels**self.alpha, self.heuristic, out=self.values)
+        if self.keep_list:
+            self.weights = self.values.tolist()
+        self.scale = 1.0
+        self.stale = False
+        return self
+
+    def sync(self, trail_level) -> "Desirability":
+        """Recompute every node if the trails changed in a way refresh_nodes() could not follow."""
+        return self.refresh(trail_level) if self.stale else self
+
+    def invalidate(self):
+        """The trails changed unevenly, e.g. were clamped or filled, every node needs recomputing."""
+        self.stale = True
+
+    def evaporate(self):
+        """Every trail decayed by one more generation's evaporation."""
+        if self.retain <= 0 or (self.scale / self.retain) ** self.alpha > self.max_scale:
+            self.stale = True
+        else:
+            self.scale /= self.retain
+
+    def refresh_nodes(self, trail_level, nodes: np.ndarray):
+        """Recompute the nodes whose trails were deposited on or locally updated."""
+        if self.stale:
+            return
+        nodes = np.unique(nodes)
+        # upcast first, a float16 or float32 trail times the scale would overflow long before float64
+        levels = trail_level.take(self.graph.cells[nodes]).astype(np.float64) * self.scale
+        weights = levels**self.alpha * self.heuristic[nodes]
+        self.values[nodes] = weights
+        if self.keep_list:
+            for node, weight in zip(nodes.tolist(), weights.tolist()):
+                self.weights[node] = weight
+
+    def update(self, node: int, level: float):
+        """The trail level on a node changed, e.g. after an ACS local update."""
+        weight = float((float(level) * self.scale) ** self.alpha * self.heuristic[node])
+        self.values[node] = weight
+        if self.keep_list:
+            self.weights[node] = weight
@@ -0,0 +1,128 @@
+"""
+Answer many origin-destination queries on one area, keeping a warm pheromone field per goal.
+
+The area's graph is built once and shared by every query, and the distances to a goal are only worked
+out by the first query to it. The pheromone a colony leaves behind on the way to a goal is cached, and
+the next query to the same goal (or to the same cluster of goals) starts from it for a few generations
+instead of from a cold colony. Fields are evicted least recently used first once the cache is full.
+"""
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+
+from ant_system import Ant
+from grid_graph import GridGraph
+from sampling import colony_seed
+from systems import make_system
+
+Position = Tuple[int, int]
+
+
+class Router:
+    """
+    Route between arbitrary cells of a (possibly rectangular) area with any ant system.
+
+    Args:
+        spec: the system to route with, as a systems.make_system spec. ACS with 10 ants by default
+        generations: generations a query to a goal without a cached field runs for
+        warm_generations: generations a query starting from a cached field runs for
+        cache_size: the most pheromone fields kept, one per goal cluster
+        goal_cluster: goals in the same goal_cluster x goal_cluster block of cells share a field
+    """
+
+    def __init__(
+        self,
+        area,
+        spec: Optional[dict] = None,
+        generations=30,
+        warm_generations=10,
+        cache_size=16,
+        goal_cluster=1,
+        seed=None,
+    ):
+        if cache_size < 0:
+            raise ValueError(f"cache_size must be 0 or greater, was {cache_size}")
+        if goal_cluster < 1:
+            raise ValueError(f"goal_cluster must be 1 or greater, was {goal_cluster}")
+        self.area = area if isinstance(area, np.memmap) else np.array(area)
+        self.graph = GridGraph(self.area)
+        self.spec = dict(spec) if spec is not None else {"system": "ACS"}
+        self.generations = generations
+        self.warm_generations = warm_generations
+        self.cache_size = cache_size
+        self.goal_cluster = goal_cluster
+        self.seed = colony_seed(seed)
+        self.fields: "OrderedDict[Position, np.ndarray]" = OrderedDict()
+        # graph of every recently asked goal, holding its goal_distance, evicted like the fields
+        self.goal_graphs: "OrderedDict[Position, GridGraph]" = OrderedDict()
+        # queries that started from a cached field, and ones that had to start cold
+        self.hits = 0
+        self.misses = 0
+
+    def goal_key(self, goal: Position) -> Position:
+        """The cluster of goals a goal shares its pheromone field with."""
+        return goal[0] // self.goal_cluster, goal[1] // self.goal_cluster
+
+    def route(self, start: Position, goal: Position) -> Optional[Ant]:
+        """
+        Find a route from start to goal.
+
+        Returns:
+            the best ant of the query, its tour runs from the first move to the goal. None if either
+            cell is blocked or the goal cannot be reached from start
+        """
+        graph = self._goal_graph(goal).with_endpoints(start, goal)
+        if graph.start < 0 or graph.goal < 0 or graph.goal_distance[graph.start] < 0:
+            return None
+        if graph.start == graph.goal:
+            return Ant(graph, 1.0, 1.0)
+
+        # a query is repeatable on its own, whatever was asked before it
+        seed = int(np.random.SeedSequence([self.seed, *start, *goal]).generate_state(1)[0])
+        system = make_system(self.spec, self.area, seed, graph=graph)
+
+        key = self.goal_key(goal)
+        field = self.fields.get(key)
+        if field is not None:
+            self.hits += 1
+            system.warm_start(field)
+            system.run(self.warm_generations)
+        else:
+            self.misses += 1
+            system.run(self.generations)
+
+        if self.cache_size:
+            # the system is dropped after the query, so its matrix can be kept without a copy
+            self.fields[key] = np.asarray(system.pher_mat)
+            self.fields.move_to_end(key)
+            while len(self.fields) > self.cache_size:
+                self.fields.popitem(last=False)
+        return system.best_ant
+
+    def _goal_graph(self, goal: Position) -> GridGraph:
+        """The graph routing to goal, sharing its goal_distance with every query that asks for it."""
+        goal = tuple(goal)
+        graph = self.goal_graphs.get(goal)
+        if graph is None:
+            graph = self.graph.with_endpoints(goal=goal)
+            # worked out here so every query graph derived from this one shares it
+            graph.goal_distance
+            self.goal_graphs[goal] = graph
+        self.goal_graphs.move_to_end(goal)
+        while len(self.goal_graphs) > max(self.cache_size, 1):
+            self.goal_graphs.popitem(last=False)
+        return graph
+
+    def route_many(self, queries: Iterable[Tuple[Position, Position]]) -> List[Optional[Ant]]:
+        """
+        Answer a batch of (start, goal) queries, in the order given.
+
+        Queries are run grouped by goal cluster, so each field is built once and then reused while it is
+        still cached, however the batch is ordered.
+        """
+        queries = list(queries)
+        order = sorted(range(len(queries)), key=lambda i: self.goal_key(queries[i][1]))
+        routes: List[Optional[Ant]] = [None] * len(queries)
+        for i in order:
+            routes[i] = self.route(*queries[i])
+        return routes
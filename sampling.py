@@ -0,0 +1,93 @@
+import random
+from typing import List, Optional, Union
+import numpy as np
+
+# uniform numbers an ant pre-draws at a time
+DRAW_BLOCK = 256
+
+
+def colony_seed(seed: Union[int, np.random.Generator, None]) -> int:
+    """
+    Turn a system's seed argument into the integer colony seed every ant's stream is derived from.
+
+    A numpy Generator is drawn from once. Without a seed one is taken from the random module, so
+    random.seed() still makes unseeded runs repeatable.
+    """
+    if isinstance(seed, np.random.Generator):
+        return int(seed.integers(2**63))
+    if seed is None:
+        return random.getrandbits(63)
+    return int(seed)
+
+
+def ant_seed(colony_seed: int, generation: int, index: int) -> int:
+    """
+    Derive the seed of a single ant from the colony seed, the generation and the ant's index.
+
+    Every ant gets its own independent stream, so the tours of a generation do not depend on
+    which worker (or how many workers) built them.
+    """
+    return int(np.random.SeedSequence([colony_seed, generation, index]).generate_state(1)[0])
+
+
+class AntStream:
+    """
+    Uniform draws of a single ant, pre-drawn in blocks from its own numpy Generator.
+
+    Tour construction takes one number per move (two for ACS) through random(), which only touches a
+    python list. The vectorized engine draws the same blocks from the same generators, so an ant's
+    tour does not depend on which engine built it.
+    """
+
+    __slots__ = ("generator", "_draws", "_next")
+
+    def __init__(self, generator: np.random.Generator):
+        self.generator = generator
+        self._draws: List[float] = []
+        self._next = 0
+
+    @classmethod
+    def for_ant(cls, colony_seed: int, generation: int, index: int) -> "AntStream":
+        return cls(np.random.default_rng(ant_seed(colony_seed, generation, index)))
+
+    def resume(self, block: np.ndarray, used: int) -> "AntStream":
+        """Carry on from a block of draws taken off the generator elsewhere, of which used are spent."""
+        self._draws = block.tolist()
+        self._next = int(used)
+        return self
+
+    def random(self) -> float:
+        if self._next == len(self._draws):
+            self._draws = self.generator.random(DRAW_BLOCK).tolist()
+            self._next = 0
+        draw = self._draws[self._next]
+        self._next += 1
+        return draw
+
+
+def choose(weights: List[float], draw: float) -> int:
+    """
+    Pick an index with probability proportional to its weight, uniformly if every weight is 0.
+
+    Samples by walking the running total until it passes draw * total, which is exactly what
+    VectorizedColony._sample does with cumsum, so both pick the same index for the same draw.
+    """
+    cumulative = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cumulative.append(total)
+    if total <= 0:
+        return min(int(draw * len(weights)), len(weights) - 1)
+
+    target = draw * total
+    for i, c in enumerate(cumulative):
+        if target < c:
+            return i
+    # draw * total can round up to total, fall back on the last index that can be picked
+    return max(i for i, w in enumerate(weights) if w > 0)
+
+
+def default_stream(stream: Optional[AntStream]) -> AntStream:
+    """Streams for ants made without one, e.g. when built outside of a system."""
+    return stream if stream is not None else AntStream(np.random.default_rng(random.getrandbits(63)))
@@ -0,0 +1,116 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import numpy as np
+
+
+class StoppingCriterion(ABC):
+    """
+    Decides when run() can stop before its generation cap, pass one or a list of them as run(stop=...).
+
+    run() calls start() once before the first generation and the criterion after every generation,
+    once the pheromone update is done. The run stops as soon as any of its criteria returns True.
+    """
+
+    def start(self, system):
+        pass
+
+    @abstractmethod
+    def __call__(self, system, generation: int, ants: List) -> bool:
+        """Return True once the run can stop."""
+
+
+class NoImprovement(StoppingCriterion):
+    """Stop once the best tour of the run has not improved for a number of generations."""
+
+    def __init__(self, generations: int):
+        if generations < 1:
+            raise ValueError(f"generations must be 1 or greater, was {generations}")
+        self.generations = generations
+
+    def start(self, system):
+        self.best_score = math.inf
+        self.since_improvement = 0
+
+    def __call__(self, system, generation, ants) -> bool:
+        if system.best_ant.tour_score < self.best_score:
+            self.best_score = system.best_ant.tour_score
+            self.since_improvement = 0
+        else:
+            self.since_improvement += 1
+        return self.since_improvement >= self.generations
+
+
+class PheromoneEntropy(StoppingCriterion):
+    """
+    Stop once the pheromone on the free cells has concentrated onto a few of them.
+
+    The entropy of the trail levels (as a distribution over the free cells) is normalised to [0, 1],
+    where 1 is an even spread. It is O(rows * cols) to compute, so it is only checked every few
+    generations.
+    """
+
+    def __init__(self, threshold: float, every=10):
+        if not 0 <= threshold <= 1:
+            raise ValueError(f"threshold must be in range [0, 1], but was {threshold}")
+        if every < 1:
+            raise ValueError(f"every must be 1 or greater, was {every}")
+        self.threshold = threshold
+        self.every = every
+
+    def __call__(self, system, generation, ants) -> bool:
+        if (generation + 1) % self.every:
+            return False
+        return pheromone_entropy(system) < self.threshold
+
+
+class Stagnation(StoppingCriterion):
+    """Stop once the ants of a generation all score within a fraction of its best ant."""
+
+    def __init__(self, threshold=0.0):
+        self.threshold = threshold
+
+    def __call__(self, system, generation, ants) -> bool:
+        best = ants[0].tour_score
+        mean = sum(a.tour_score for a in ants) / len(ants)
+        return mean - best <= self.threshold * best
+
+
+class TargetScore(StoppingCriterion):
+    """Stop once a tour within tolerance of a known optimum is found, e.g. the A* route length."""
+
+    def __init__(self, score: float, tolerance=0.0):
+        self.score = score
+        self.tolerance = tolerance
+
+    def __call__(self, system, generation, ants) -> bool:
+        return system.best_ant.tour_score <= self.score * (1 + self.tolerance)
+
+
+class Budget(StoppingCriterion):
+    """Stop once a wall clock time in seconds, or a number of built tours, has been used up."""
+
+    def __init__(self, seconds: Optional[float] = None, tours: Optional[int] = None):
+        self.seconds = seconds
+        self.tours = tours
+
+    def start(self, system):
+        self.started = time.perf_counter()
+        self.built = 0
+
+    def __call__(self, system, generation, ants) -> bool:
+        self.built += len(ants)
+        if self.tours is not None and self.built >= self.tours:
+            return True
+        return self.seconds is not None and time.perf_counter() - self.started >= self.seconds
+
+
+def pheromone_entropy(system) -> float:
+    """Entropy of the trail levels on the free cells, normalised so that an even spread is 1."""
+    levels = np.asarray(system.pher_mat).ravel()[system.graph.cells]
+    total = levels.sum()
+    if levels.size < 2 or total <= 0:
+        return 1.0
+    p = levels[levels > 0] / total
+    return float(-(p * np.log(p)).sum() / math.log(levels.size))
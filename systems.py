@@ -0,0 +1,29 @@
+"""Build any of the ant systems by name, from a plain dict of its parameters."""
+from ant_colony import AntColony
+from ant_system import AntSystem, ElitistAntSystem
+from max_min_ant_system import MaxMinAntSystem
+
+SYSTEM_CLASSES = {"AS": AntSystem, "EAS": ElitistAntSystem, "ACS": AntColony, "MMAS": MaxMinAntSystem}
+
+
+def make_system(spec: dict, area, seed=None, **options):
+    """
+    Build the system a spec describes.
+
+    Args:
+        spec: a "system" of "AS", "EAS", "ACS" or "MMAS", an "ants" count (10 by default) and any of
+            that system's keyword arguments. q is short for exploitation_threshold, and elites
+            defaults to 3 for AS and EAS
+        options: further keyword arguments for the system, e.g. a prebuilt graph
+    """
+    if spec.get("system") not in SYSTEM_CLASSES:
+        raise ValueError(f"system must be one of {tuple(SYSTEM_CLASSES)}: {spec}")
+    params = {k: v for k, v in spec.items() if k not in ("system", "ants")}
+    params.update(options)
+    system_class = SYSTEM_CLASSES[spec["system"]]
+    ants = spec.get("ants", 10)
+    if spec["system"] in ("AS", "EAS"):
+        return system_class(area, ants, params.pop("elites", min(3, ants)), seed=seed, **params)
+    if "q" in params:
+        params["exploitation_threshold"] = params.pop("q")
+    return system_class(area, ants, seed=seed, **params)